@@ -21,11 +21,18 @@ setup(
         "s3fs",
         "xarray"
     ],
+    extras_require={
+        "gdal": ["GDAL"],
+        "zarr": ["zarr"],
+        "test": ["moto[server]", "zarr"]
+    },
     entry_points={
         'console_scripts': [
             'extract_mrms=geoetl.examples.extract_mrms:main',
             'extract_noaa_aggregate=geoetl.examples.extract_noaa_aggregate:main',
-            'test_geoetl=geoetl.tests.index:main'
+            'extract_noaa_rolling=geoetl.examples.extract_noaa_aggregate:rolling_main',
+            'test_geoetl=geoetl.tests.index:main',
+            'bench_geoetl=geoetl.tests.benchmark:main'
         ]
     },
     python_requires=">=3.6"
@@ -1,16 +1,35 @@
 import os
-import requests
-import htmllistparse
+import gzip
+import mmap
+import zlib
+import shlex
+import signal
+import shutil
+import hashlib
+import tempfile
+import s3fs
+import subprocess
+import numpy as np
+import multiprocessing
 from io import BytesIO
-from functools import reduce
-from typing import List, Dict, Type
+from itertools import groupby
+from typing import List, Dict, Type, Iterator, Iterable
 from collections.abc import Callable
-from .utils import xor, get_temp_file
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .utils import xor, get_temp_file, bounded_map
+from .download import Downloader, get_downloader
+from .metrics import Metrics, NullMetrics
+from .cli import CommandError, format_argv, get_command_pool
+from .scratch import current_workspace
 
 
 class Validator:
     '''
     Handle application state here. Allows is_valid to make stateful decisions, e.g. caching
+    is_header_valid only sees response headers, so APISource can reject a product before its body is downloaded.
+    query returns indexed constraints (product, start, end, max_size) for indexes that support lookups,
+    see crawler.ListingIndex.query, and mask a boolean row mask over a columnar geoapi.ListingStore (None keeps all rows).
+    select gives the listings of a store that pass, by default is_valid over the rows mask kept
     '''
     def __init__(self):
         pass
@@ -18,6 +37,21 @@ class Validator:
     def is_valid(self):
         pass
 
+    def is_header_valid(self, headers) -> bool:
+        return True
+
+    def query(self) -> Dict:
+        return {}
+
+    def mask(self, store):
+        return None
+
+    def select(self, store) -> Iterable:
+        return filter(self.is_valid, store.listings(self.mask(store)))
+
+    def is_resp_valid(self, resp) -> bool:
+        return self.is_header_valid(resp.headers)
+
 
 class FileNode:
     '''
@@ -25,14 +59,61 @@ class FileNode:
     Applying T to a FileNode returns a FileNode.
     in_memory here is a descriptor, not an instruction
     '''
-    def __init__(self, filepath: str='', metadata: dict={}, in_memory: bool=False, content=BytesIO()):
+    def __init__(self, filepath: str='', metadata: dict={}, in_memory: bool=False, content: BytesIO=None):
         if not xor(filepath, in_memory):
             raise Exception('Must provide a filepath or enable in_memory')
 
         self.filepath = filepath
         self.metadata = metadata
         self.in_memory = in_memory
-        self.content = content
+        self.content = content if content is not None or not in_memory else BytesIO()
+
+    def size(self) -> int:
+        if self.in_memory:
+            return self.content.getbuffer().nbytes if self.content is not None else 0
+        return os.path.getsize(self.filepath) if os.path.exists(self.filepath) else 0
+
+    def read(self) -> bytes:
+        if self.in_memory:
+            return self.content.getvalue()
+        with open(self.filepath, 'rb') as f:
+            return f.read()
+
+    def buffer(self) -> memoryview:
+        '''
+        Read-only zero-copy view of the content: of the BytesIO buffer for in-memory nodes, of a read-only mmap
+        of the file otherwise. The view pins the content (a BytesIO can't be resized while it is alive),
+        release() it or drop it before writing to the node
+        '''
+        if self.in_memory:
+            if self.content is None:
+                return memoryview(b'')
+            return self.content.getbuffer().toreadonly()
+        with open(self.filepath, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Empty files can't be mapped
+                return memoryview(b'')
+            # The mapping outlives the file descriptor and is unmapped once no view refers to it
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def array(self, dtype=np.uint8, shape: tuple=None, offset: int=0) -> np.ndarray:
+        '''
+        Read-only NumPy view of a raw grid payload (no header) starting at offset bytes, e.g. node.array(np.float32, (rows, cols))
+        '''
+        count = -1 if shape is None else int(np.prod(shape))
+        values = np.frombuffer(self.buffer(), dtype=dtype, count=count, offset=offset)
+        return values if shape is None else values.reshape(shape)
+
+    def materialize(self, prefix: str='') -> 'FileNode':
+        '''
+        Disk-backed copy of an in-memory node, for transforms that need a path
+        '''
+        if not self.in_memory:
+            return self
+        filepath = get_temp_file(prefix=prefix, size_hint=self.size())
+        with open(filepath, 'wb') as f:
+            f.write(self.content.getbuffer())
+        return FileNode(filepath=filepath, metadata=self.metadata)
     
     def truncate(self) -> None:
         if self.in_memory:
@@ -51,7 +132,10 @@ class FileNode:
 class Transform:
     '''
     A directed edge between two FileNode objects, connected by .transform()
+    Transforms that can read FileNode.content set in_memory_source, others are handed a file on disk
     '''
+    in_memory_source = False
+
     def __init__(self, node: FileNode=None, debug=False):
         self.source_node = node
         self.source_filepath = node.filepath
@@ -67,45 +151,117 @@ class Transform:
         pass
     
     def get_temp_file(self) -> str:
-        return get_temp_file(prefix=self.__name__)
+        # The output is assumed to be about the size of the source
+        return get_temp_file(prefix=type(self).__name__, size_hint=self.source_node.size())
+
+    @classmethod
+    def signature(cls) -> str:
+        '''
+        Identifies what this transform does, used to key cached outputs
+        '''
+        return f'{cls.__module__}.{cls.__name__}'
     
     def remove_source(self) -> None:
         self.source_node.truncate()
 
 
 class CLIBaseTransform(Transform):
-
+    '''
+    command is a template using {source} and {destination}, run as an argv list (no shell) through the
+    shared cli.CommandPool, with an optional "> {destination}" stdout redirect. A non-zero exit raises
+    cli.CommandError with the captured stderr; timeout (seconds) kills a stuck command.
+    stream_command, if set, is the same step as an argv reading stdin and writing stdout,
+    which lets Transformer(stream=True) pipe consecutive steps without temp files.
+    batch_command, if set, handles many files per invocation through {sources}, {destinations}
+    or {pairs} (source1 destination1 source2 ...), see transform_batch
+    '''
     executable = ''
     command = ''
+    stream_command = ''
+    batch_command = ''
+    batch_size = 64
+    timeout = None
 
     def __init__(self, *args, **kwargs):
         super(CLIBaseTransform, self).__init__(*args, **kwargs)
 
-    def _format_command(self, source_filepath: str, destination_filepath: str) -> str:
-        return self.command.replace('{source}', source_filepath).replace('{destination}', destination_filepath)
+    @classmethod
+    def signature(cls) -> str:
+        # Made classes share a name and command but not how they run it, e.g. GDALWarpFactory engines
+        bases = ','.join(f'{base.__module__}.{base.__qualname__}' for base in cls.__bases__)
+        return f'{cls.__name__}({bases}):{cls.command}'
+
+    @classmethod
+    def _format_command(cls, source_filepath: str, destination_filepath: str):
+        return format_argv(cls.command, source=source_filepath, destination=destination_filepath)
 
     def execute(self, source: str, dest: str) -> int:
-        cmd = os.system(self._format_command(source, dest))
-        exit_code = os.WEXITSTATUS(cmd)
-        return exit_code
+        argv, stdout_filepath = self._format_command(source, dest)
+        completed = get_command_pool().run(argv, stdout_filepath, self.timeout)
+        self.stderr = completed.stderr.decode(errors='replace')
+        return completed.returncode
 
     def transform(self) -> FileNode:
         destination_filepath = self.get_temp_file()
-        self.execute(self.source_filepath, destination_filepath)
+        self.exit_code = self.execute(self.source_filepath, destination_filepath)
+        if self.exit_code:
+            if os.path.exists(destination_filepath):
+                os.remove(destination_filepath)
+            raise CommandError(self._format_command(self.source_filepath, destination_filepath)[0], self.exit_code, self.stderr)
         return FileNode(filepath=destination_filepath)
-    
+
+    @classmethod
+    def batch_argv(cls, sources: List[str], destinations: List[str]) -> List[str]:
+        '''
+        argv handling all sources at once, None if this transform has no batch form
+        '''
+        if not cls.batch_command:
+            return None
+        return format_argv(cls.batch_command, sources=sources, destinations=destinations)[0]
+
+    @classmethod
+    def transform_batch(cls, nodes: List[FileNode]) -> List[FileNode]:
+        '''
+        Output node per input node on disk, all or nothing: the first failure is raised as a CommandError.
+        With a batch form, batch_size files share one invocation (one fork/exec and driver startup);
+        otherwise each file is its own command, run concurrently through the pool
+        '''
+        pool = get_command_pool()
+        sources = [node.filepath for node in nodes]
+        destinations = [get_temp_file(prefix=cls.__name__, size_hint=node.size()) for node in nodes]
+        if cls.batch_argv(sources[:1], destinations[:1]) is None:
+            futures = [pool.submit(*cls._format_command(source, destination), cls.timeout) for source, destination in zip(sources, destinations)]
+        else:
+            futures = [pool.submit(cls.batch_argv(sources[start:start + cls.batch_size], destinations[start:start + cls.batch_size]), None, cls.timeout)
+                       for start in range(0, len(nodes), cls.batch_size)]
+
+        errors = []
+        for future in futures:
+            try:
+                completed = future.result()
+                if completed.returncode:
+                    errors.append(CommandError(completed.args, completed.returncode, completed.stderr.decode(errors='replace')))
+            except CommandError as e:
+                errors.append(e)
+
+        outputs = [FileNode(filepath=destination, metadata=node.metadata) for node, destination in zip(nodes, destinations)]
+        missing = [output.filepath for output in outputs if not os.path.exists(output.filepath)]
+        if errors or missing:
+            for output in outputs:
+                output.truncate()
+            raise errors[0] if errors else CommandError([cls.__name__], -1, f'missing outputs {missing}')
+        return outputs
+
     @classmethod
-    def make(cls, name, executable, command):
+    def make(cls, name, executable, command, stream_command='', batch_command=''):
         return type(
             name,
             (cls,),
-            {'executable': executable, 'command': command})
+            {'executable': executable, 'command': command, 'stream_command': stream_command, 'batch_command': batch_command})
 
     @classmethod
-    def check_installation() -> bool:
-        cmd = os.system(f'command -v {cls.executable} > /dev/null 2>&1')
-        exit_code = os.WEXITSTATUS(cmd)
-        if exit_code:
+    def check_installation(cls) -> bool:
+        if shutil.which(cls.executable) is None:
             print(f'Command {cls.executable} not found, please install and put in PATH')
             return False
         return True
@@ -114,78 +270,338 @@ class CLIBaseTransform(Transform):
 class UnzipTransform(CLIBaseTransform):
     executable = 'gunzip'
     command = 'gunzip -c {source} > {destination}'
+    stream_command = 'gunzip -c'
 
     def __init__(self, *args, **kwargs):
         super(UnzipTransform, self).__init__(*args, **kwargs)
 
 
+def gunzip(data) -> bytes:
+    '''
+    gzip.decompress for any buffer, without gzip.decompress's copy of the input into a BytesIO
+    '''
+    members = []
+    while data:
+        # One decompressor per gzip member, the rest of the input is left in unused_data
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        members.append(decompressor.decompress(data))
+        if not decompressor.eof:
+            raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+        data = decompressor.unused_data
+    return b''.join(members)
+
+
+class GzipTransform(Transform):
+    '''
+    gzip without forking, the output node is kept in memory
+    '''
+    in_memory_source = True
+    compresslevel = 6
+
+    def transform(self) -> FileNode:
+        content = gzip.compress(self.source_node.buffer(), compresslevel=self.compresslevel, mtime=0)
+        return FileNode(in_memory=True, content=BytesIO(content), metadata=self.source_metadata)
+
+
+class GunzipTransform(Transform):
+    '''
+    gunzip without forking, the output node is kept in memory
+    '''
+    in_memory_source = True
+
+    def transform(self) -> FileNode:
+        return FileNode(in_memory=True, content=BytesIO(gunzip(self.source_node.buffer())), metadata=self.source_metadata)
+
+
 class Transformer:
-    def __init__(self, transforms: List[Type[Transform]], remove_source=True, debug=False):
+    '''
+    With stream=True, consecutive CLI transforms that define stream_command run as one
+    subprocess pipeline, only the last step of each run is written to disk.
+    Each step is timed into metrics (see metrics.Metrics) when given
+    '''
+    def __init__(self, transforms: List[Type[Transform]], remove_source=True, debug=False, stream=False, cache=None, metrics: Metrics=None):
         self.transforms = transforms
         self.remove_source = remove_source
         self.debug = debug
+        self.stream = stream
+        self.cache = cache
+        self.metrics = metrics or NullMetrics()
 
-    def transformed_node(self, root: FileNode) -> FileNode:
-        return reduce(lambda node, T: self.apply(node, T), [root] + self.transforms)
+    def transformed_node(self, root: FileNode=None, key: str='', source: Callable=None) -> FileNode:
+        '''
+        Pass root, or a source callable returning the root so it is only fetched on a cache miss.
+        With a cache and a key identifying the root, each step output is stored under
+        hash(previous key, step signature) and the chain resumes from the last cached step
+        '''
+        steps = list(zip(self.transforms, self.step_keys(key)))
+        node = None
+        if self.cache is not None and key:
+            node, done = self.lookup([step_key for _, step_key in steps])
+            steps = steps[done:]
+        if node is None:
+            node = root if root is not None else source()
+
+        try:
+            for streamable, group in groupby(steps, key=lambda step: self.stream and self.is_streamable(step[0])):
+                group = list(group)
+                if streamable:
+                    node = self.apply_stream(node, [T for T, _ in group])
+                    self.store(group[-1][1], node)
+                    continue
+                for T, step_key in group:
+                    node = self.apply(node, T)
+                    self.store(step_key, node)
+        except Exception:
+            # The failed step's input is an intermediate of this chain (or the fetched source), never the caller's root
+            if node is not root:
+                node.truncate()
+            raise
+        return node
+
+    def transformed_batch(self, roots: List[FileNode]) -> List[FileNode]:
+        '''
+        Each step applied to all roots before the next one; CLI steps go through transform_batch,
+        so their files run concurrently or share invocations. No cache or streaming here
+        '''
+        nodes = roots
+        try:
+            for T in self.transforms:
+                if not (isinstance(T, type) and issubclass(T, CLIBaseTransform)):
+                    outputs = []
+                    try:
+                        for node in nodes:
+                            outputs.append(self.apply(node, T))
+                    except Exception:
+                        for output in outputs:
+                            output.truncate()
+                        raise
+                    nodes = outputs
+                    continue
+
+                print('Applying batch ' + T.__name__)
+                # Disk copies of in-memory nodes belong to the Transformer, they are removed whatever remove_source is
+                sources = [node.materialize(prefix=T.__name__) if node.in_memory else node for node in nodes]
+                try:
+                    with self.metrics.stage(T.__name__, input_bytes=sum(source.size() for source in sources)) as stage:
+                        outputs = T.transform_batch(sources)
+                        stage['output_bytes'] = sum(output.size() for output in outputs)
+                finally:
+                    for source, node in zip(sources, nodes):
+                        if source is not node:
+                            source.truncate()
+                if self.remove_source:
+                    for node in nodes:
+                        node.truncate()
+                nodes = outputs
+        except Exception:
+            # The failed step's inputs are intermediates of this chain, never the caller's roots
+            if nodes is not roots:
+                for node in nodes:
+                    node.truncate()
+            raise
+        return nodes
+
+    def step_keys(self, key: str) -> List[str]:
+        if not key:
+            return [''] * len(self.transforms)
+        keys = []
+        for T in self.transforms:
+            key = hashlib.sha256(f'{key}\0{T.signature()}'.encode()).hexdigest()
+            keys.append(key)
+        return keys
+
+    def lookup(self, keys: List[str]):
+        for done in range(len(keys), 0, -1):
+            node = self.cache.get(keys[done - 1])
+            if node is not None:
+                return node, done
+        return None, 0
+
+    def store(self, key: str, node: FileNode) -> None:
+        if self.cache is not None and key:
+            self.cache.put(key, node)
      
     def apply(self, node, T) -> FileNode:
         print('Applying ' + T.__name__)
-        initial = T(node, debug=self.debug)                   # Transform object
-        output_file_node = initial.transform()          # FileNode object
+        # A disk copy of an in-memory node belongs to the Transformer, it is removed whatever remove_source is
+        source = node.materialize(prefix=T.__name__) if node.in_memory and not T.in_memory_source else node
+        output_file_node = None
+        try:
+            with self.metrics.stage(T.__name__, input_bytes=source.size()) as stage:
+                initial = T(source, debug=self.debug)                   # Transform object
+                output_file_node = initial.transform()          # FileNode object
+                stage['output_bytes'] = output_file_node.size()
+                if hasattr(initial, 'exit_code'):
+                    stage['exit_codes'] = [initial.exit_code]
+        finally:
+            # Unless the step handed its source back as the output
+            if source is not node and (output_file_node is None or output_file_node.filepath != source.filepath):
+                source.truncate()
         if self.remove_source:
-            initial.remove_source()
+            if source is not node:
+                node.truncate()
+            else:
+                initial.remove_source()
         initial.finalize()
 
         return output_file_node
 
+    def apply_stream(self, node: FileNode, transforms: List[Type[CLIBaseTransform]]) -> FileNode:
+        name = ' | '.join(T.__name__ for T in transforms)
+        print('Streaming ' + name)
+        with self.metrics.stage(name, input_bytes=node.size()) as stage:
+            destination_filepath, exit_codes, stderrs = self.stream_to_file(node, transforms)
+            stage['exit_codes'] = exit_codes
+            if any(exit_codes):
+                os.remove(destination_filepath)
+                # Upstream steps killed by SIGPIPE only report that a later step stopped reading
+                failed = [i for i, code in enumerate(exit_codes) if code and code != -signal.SIGPIPE] or \
+                    [i for i, code in enumerate(exit_codes) if code]
+                raise CommandError(shlex.split(transforms[failed[0]].stream_command), exit_codes[failed[0]], stderrs[failed[0]])
+            stage['output_bytes'] = os.path.getsize(destination_filepath)
+
+        if self.remove_source:
+            node.truncate()
+        return FileNode(filepath=destination_filepath)
+
+    def stream_to_file(self, node: FileNode, transforms: List[Type[CLIBaseTransform]]):
+        destination_filepath = get_temp_file(prefix=transforms[-1].__name__, size_hint=node.size())
+
+        processes = []
+        # stderr goes to files rather than pipes, so a chatty step can't block while others are waited on
+        stderr_files = [tempfile.TemporaryFile() for _ in transforms]
+        with open(destination_filepath, 'wb') as destination:
+            # In-memory nodes are written to the first process instead of a file
+            stdin = subprocess.PIPE if node.in_memory else open(node.filepath, 'rb')
+            for i, T in enumerate(transforms):
+                stdout = destination if i == len(transforms) - 1 else subprocess.PIPE
+                process = subprocess.Popen(shlex.split(T.stream_command), stdin=stdin, stdout=stdout, stderr=stderr_files[i])
+                if stdin is not subprocess.PIPE:
+                    # Parent copy is closed so upstream sees SIGPIPE if downstream exits
+                    stdin.close()
+                stdin = process.stdout
+                processes.append(process)
+
+            if node.in_memory:
+                try:
+                    processes[0].stdin.write(node.content.getbuffer())
+                except BrokenPipeError:
+                    pass
+                processes[0].stdin.close()
+            exit_codes = [process.wait() for process in processes]
+
+        stderrs = []
+        for stderr_file in stderr_files:
+            stderr_file.seek(0)
+            stderrs.append(stderr_file.read().decode(errors='replace'))
+            stderr_file.close()
+        return destination_filepath, exit_codes, stderrs
+
+    @staticmethod
+    def is_streamable(T: Type[Transform]) -> bool:
+        return bool(getattr(T, 'stream_command', ''))
+
 
 class APISource:
-    def __init__(self, url: str, validator: Validator, transformer: Transformer, name: str=''):
+    '''
+    With a header_cache (e.g. cache.HeaderCache), downloads are conditional on ETag/Last-Modified
+    '''
+    def __init__(self, url: str, validator: Validator, transformer: Transformer, name: str='', downloader: Downloader=None, header_cache=None):
         self.url = url
         self.validator = validator
         self.transformer = transformer
         self.name = name
+        self.downloader = downloader or get_downloader()
+        self.header_cache = header_cache
     
     def download(self) -> FileNode:
-        resp = requests.get(self.url)
-        is_valid = self.validator.is_resp_valid(resp)
-
-        if resp.status_code != 200:
-            raise Exception('Failed request for ' + (name or self.url))
-        
+        '''
+        Returns None, with nothing written, if the validator rejects the response headers
+        or the server reports the product unchanged since the last download
+        '''
+        headers = self.header_cache.conditional_headers(self.url) if self.header_cache is not None else {}
         filepath = get_temp_file()
-        with open(filepath, 'wb') as f:
-            f.write(resp.content)
-        
-        return FileNode(filepath=filepath, metadata={'is_valid': is_valid})
+        resp = self.downloader.download(self.url, filepath, headers=headers, accept=self.validator.is_resp_valid)
+        if resp is None:
+            print('Skipping ' + (self.name or self.url))
+            return None
+
+        if self.header_cache is not None:
+            self.header_cache.update(self.url, resp.headers)
+            self.header_cache.save()
+        return FileNode(filepath=filepath, metadata={'is_valid': True})
     
     def transform(self) -> FileNode:
-        return self.transformer.transformed_node(root=self.download())
+        root = self.download()
+        if root is None:
+            return None
+        return self.transformer.transformed_node(root=root)
    
 
 class Listing:
+    __slots__ = ('url',)
+
     def __init__(self, url: str):
         self.url = url
-    
-    def download(self) -> FileNode:
-        resp = requests.get(self.url)
-        if resp.status_code != 200:
-            raise Exception('Failed request for ' + listing.name)
 
-        filepath = get_temp_file()
-        with open(filepath, 'wb') as f:
-            f.write(resp.content)
+    def key(self) -> str:
+        '''
+        Changes whenever the remote file changes
+        '''
+        return self.url
 
+    def timestamp(self) -> float:
+        '''
+        Epoch seconds of the remote file, None if unknown
+        '''
+        return None
+    
+    def download(self, downloader: Downloader=None) -> FileNode:
+        filepath = get_temp_file()
+        (downloader or get_downloader()).download(self.url, filepath)
         return FileNode(filepath=filepath)
 
 
+_process_index = None
+
+
+def _set_process_index(index) -> None:
+    # Runs once per forked worker, so the index (and any dynamically made Transform classes) is never pickled
+    global _process_index
+    _process_index = index
+
+
+def _process_transform_node(listing):
+    return _process_index.safe_transform_node(listing)
+
+
 class Index:
-    def __init__(self, url: str, validator: Validator, transformer: Transformer):
+    '''
+    mode is one of 'serial', 'thread', 'process' or 'batch'.
+    Parallel modes keep at most 2 * max_workers listings in flight and yield nodes in listing order.
+    Inside a scratch.Workspace with a quota, a listing (or batch) only starts once the workspace has space.
+    'batch' downloads batch_size listings at a time on threads and runs them through Transformer.transformed_batch,
+    which amortizes process startup of CLI steps; a failing step fails the whole batch.
+    A listing that raises is recorded in self.failures instead of stopping the run.
+    With a manifest, transformed listings are recorded and new_only=True skips unchanged ones
+    '''
+    modes = ('serial', 'thread', 'process', 'batch')
+    batch_size = 64
+
+    def __init__(self, url: str, validator: Validator, transformer: Transformer, mode: str='serial', max_workers: int=None, manifest=None, downloader: Downloader=None):
+        if mode not in self.modes:
+            raise ValueError(f'Unknown mode {mode}, expected one of {self.modes}')
+
         # index url, e.g. apache folder
         self.url = url
         self.validator = validator
         self.transformer = transformer
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.manifest = manifest
+        self.downloader = downloader
         self.listings = []
+        self.failures = []
     
     def fetch_listings(self):
         '''
@@ -194,20 +610,138 @@ class Index:
         raise NotImplementedError
 
     def aggregate(self, aggregator, *args, **kwargs) -> FileNode:
+        '''
+        aggregator is either called on the list of nodes or, if it has add/result
+        (e.g. geoapi.SumAccumulator), fed each node as soon as it is transformed
+        '''
+        if hasattr(aggregator, 'add'):
+            for node in self.iter_transform_index():
+                aggregator.add(node)
+            return aggregator.result()
+
         nodes = self.transform_index()
         result = aggregator(*args, nodes=nodes, **kwargs)
 
         return result
+
+    def download_listing(self, listing: Listing) -> FileNode:
+        return listing.download(self.downloader)
     
     def transform_node(self, listing: Listing) -> FileNode:
-        return self.transformer.transformed_node(root=self.download_listing(listing))
+        node = self.transformer.transformed_node(key=listing.key(), source=lambda: self.download_listing(listing))
+        node.metadata = {**node.metadata, 'key': listing.key(), 'timestamp': listing.timestamp()}
+        return node
+
+    def safe_transform_node(self, listing: Listing):
+        try:
+            return self.transform_node(listing), None
+        except Exception as e:
+            return None, e
+
+    def get_executor(self):
+        if self.mode == 'thread':
+            return ThreadPoolExecutor(max_workers=self.max_workers)
+        # fork lets workers inherit the index as-is
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_set_process_index,
+            initargs=(self,))
+
+    def select_listings(self) -> Iterable[Listing]:
+        '''
+        Extend this to narrow listings with indexed lookups before is_valid
+        '''
+        return filter(self.validator.is_valid, self.listings)
+
+    def iter_transform_index(self, new_only: bool=False) -> Iterator[FileNode]:
+        listings = self.select_listings()
+        if new_only and self.manifest is not None:
+            listings = filter(self.manifest.is_changed, listings)
+        self.failures = []
+
+        if self.mode == 'serial':
+            results = ((listing, self.safe_transform_node(listing)) for listing in self.throttle(listings))
+            yield from self._collect(results)
+            return
+        if self.mode == 'batch':
+            yield from self._collect(self.iter_batches(listings))
+            return
+
+        func = self.safe_transform_node if self.mode == 'thread' else _process_transform_node
+        with self.get_executor() as executor:
+            listings = list(listings)
+            results = zip(listings, bounded_map(executor, func, listings, window=2 * self.max_workers, workspace=current_workspace()))
+            yield from self._collect(results)
+
+    @staticmethod
+    def throttle(items: Iterable) -> Iterator:
+        '''
+        Hands out items only while the active scratch.Workspace is under its quota. Only for sequential
+        consumers, which have had every earlier result by the time they ask for the next item
+        '''
+        workspace = current_workspace()
+        for item in items:
+            if workspace is not None:
+                workspace.wait_for_space()
+            yield item
+
+    def safe_download_listing(self, listing: Listing):
+        try:
+            return self.download_listing(listing), None
+        except Exception as e:
+            return None, e
+
+    def iter_batches(self, listings) -> Iterator:
+        '''
+        (listing, (node, error)) pairs, batch_size listings at a time
+        '''
+        listings = list(listings)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for start in self.throttle(range(0, len(listings), self.batch_size)):
+                batch = listings[start:start + self.batch_size]
+                downloaded = []
+                for listing, (node, error) in zip(batch, executor.map(self.safe_download_listing, batch)):
+                    if error is not None:
+                        yield listing, (None, error)
+                    else:
+                        downloaded.append((listing, node))
+
+                try:
+                    results = [(node, None) for node in self.transformer.transformed_batch([node for _, node in downloaded])]
+                except Exception as e:
+                    # Downloads are the index's own, the Transformer leaves roots to their owner
+                    for _, node in downloaded:
+                        node.truncate()
+                    results = [(None, e)] * len(downloaded)
+                for (listing, _), (node, error) in zip(downloaded, results):
+                    if node is not None:
+                        node.metadata = {**node.metadata, 'key': listing.key(), 'timestamp': listing.timestamp()}
+                    yield listing, (node, error)
+
+    def _collect(self, results) -> Iterator[FileNode]:
+        for listing, (node, error) in results:
+            if error is not None:
+                print(f'Failed {getattr(listing, "url", listing)}: {error!r}')
+                self.failures.append((listing, error))
+                continue
+            if self.manifest is not None:
+                self.manifest.record(listing)
+            yield node
+
+        if self.manifest is not None:
+            self.manifest.save()
     
-    def transform_index(self) -> List[FileNode]:
-        nodes = map(lambda listing: self.transform_node(listing), filter(self.validator.is_valid, self.listings))
-        return nodes
+    def transform_index(self, new_only: bool=False) -> List[FileNode]:
+        return list(self.iter_transform_index(new_only=new_only))
 
 
 class SimpleS3Bucket:
+    '''
+    Copies stream through s3fs in chunk_size blocks, see sinks.S3Sink for concurrent multipart transfers
+    '''
+    chunk_size = 2**22
+
     def __init__(self, bucket):
         self.s3 = s3fs.S3FileSystem(anon=False)
         self.bucket = bucket
@@ -215,19 +749,22 @@ class SimpleS3Bucket:
             self.bucket += '/'
     
     def get(self, source_filepath, destination_filepath):
-        with self.s3.open(bucket + source_filepath, 'rb') as s:
+        with self.s3.open(self.bucket + source_filepath, 'rb') as s:
             with open(destination_filepath, 'wb') as f:
-                f.write(s.read())
+                shutil.copyfileobj(s, f, self.chunk_size)
 
     def get_obj(self, source_filepath):
-        with self.s3.open(bucket + source_filepath, 'rb') as s:
-            return BytesIO(s.read())
+        content = BytesIO()
+        with self.s3.open(self.bucket + source_filepath, 'rb') as s:
+            shutil.copyfileobj(s, content, self.chunk_size)
+        content.seek(0)
+        return content
 
     def put(self, source_filepath, destination_filepath):
-        with self.s3.open(bucket + destination_filepath, 'wb') as f:
+        with self.s3.open(self.bucket + destination_filepath, 'wb', block_size=max(self.chunk_size, 5 * 2**20)) as f:
             with open(source_filepath, 'rb') as s:
-                f.write(s.read())
+                shutil.copyfileobj(s, f, self.chunk_size)
     
     def put_obj(self, source_content, destination_filepath):
-        with self.s3.open(bucket + destination_filepath, 'wb') as f:
-            f.write(source_content.getvalue())
\ No newline at end of file
+        with self.s3.open(self.bucket + destination_filepath, 'wb') as f:
+            f.write(source_content.getbuffer())
\ No newline at end of file
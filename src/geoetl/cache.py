@@ -0,0 +1,127 @@
+import os
+import json
+import shutil
+import threading
+from .api import FileNode, Listing
+from .utils import get_temp_file
+
+
+class JSONStore:
+    '''
+    Dict persisted as a JSON file, saved atomically
+    '''
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.entries = {}
+        if os.path.exists(filepath):
+            with open(filepath, 'r') as f:
+                self.entries = json.load(f)
+
+    def save(self) -> None:
+        tmp_filepath = self.filepath + '.tmp'
+        with open(tmp_filepath, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_filepath, self.filepath)
+
+
+class ListingManifest(JSONStore):
+    '''
+    Persistent record of transformed listings, keyed on Listing.key() (name, size and modified time)
+    '''
+    def is_changed(self, listing: Listing) -> bool:
+        return self.entries.get(listing.url) != listing.key()
+
+    def record(self, listing: Listing) -> None:
+        self.entries[listing.url] = listing.key()
+
+
+class HeaderCache(JSONStore):
+    '''
+    Persistent ETag/Last-Modified per url, replayed as If-None-Match/If-Modified-Since
+    '''
+    def conditional_headers(self, url: str) -> dict:
+        entry = self.entries.get(url, {})
+        headers = {}
+        if entry.get('ETag'):
+            headers['If-None-Match'] = entry['ETag']
+        if entry.get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['Last-Modified']
+        return headers
+
+    def update(self, url: str, headers) -> None:
+        self.entries[url] = {key: headers.get(key) for key in ('ETag', 'Last-Modified')}
+
+
+class DirectoryCache(HeaderCache):
+    '''
+    HeaderCache that also keeps the parsed entries of each directory listing,
+    so a 304 Not Modified answer can be served without parsing the page again
+    '''
+    def entries_of(self, url: str) -> list:
+        return self.entries.get(url, {}).get('entries', [])
+
+    def update(self, url: str, headers, entries: list=None) -> None:
+        super().update(url, headers)
+        self.entries[url]['entries'] = entries or []
+
+
+class NodeCache:
+    '''
+    Content-addressed store of FileNode outputs, see Transformer.transformed_node for the keys.
+    Entries are files named by key; hits refresh the mtime and the oldest entries
+    are evicted once the cache grows past max_bytes
+    '''
+    def __init__(self, directory: str, max_bytes: int=10**9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> FileNode:
+        '''
+        Returns a copy so the caller is free to truncate it
+        '''
+        destination_filepath = get_temp_file(prefix='cache')
+        try:
+            shutil.copyfile(self.path(key), destination_filepath)
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            if os.path.exists(destination_filepath):
+                os.remove(destination_filepath)
+            return None
+        return FileNode(filepath=destination_filepath)
+
+    def put(self, key: str, node: FileNode) -> None:
+        tmp_filepath = f'{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        if node.in_memory:
+            with open(tmp_filepath, 'wb') as f:
+                f.write(node.content.getbuffer())
+        else:
+            shutil.copyfile(node.filepath, tmp_filepath)
+        os.replace(tmp_filepath, self.path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        with self.lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
@@ -0,0 +1,121 @@
+import os
+import sys
+import shlex
+import threading
+import subprocess
+from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future
+
+
+class CommandError(Exception):
+    def __init__(self, argv: List[str], exit_code: int, stderr: str=''):
+        self.argv = argv
+        self.exit_code = exit_code
+        self.stderr = stderr
+        reason = 'timed out' if exit_code is None else f'exited with {exit_code}'
+        super(CommandError, self).__init__(f'{shlex.join(argv)} {reason}: {stderr.strip()[-2000:]}')
+
+    def __reduce__(self):
+        # Rebuilt from its own arguments when sent back from a process worker
+        return type(self), (self.argv, self.exit_code, self.stderr)
+
+
+def format_argv(command: str, source: str='', destination: str='', sources: List[str]=(), destinations: List[str]=()) -> Tuple[List[str], str]:
+    '''
+    Command template -> (argv, stdout filepath or None). Arguments are substituted per token, so paths are
+    never reparsed by a shell; a trailing "> {destination}" becomes a stdout redirect
+    '''
+    tokens = shlex.split(command)
+    stdout_filepath = None
+    if '>' in tokens:
+        position = tokens.index('>')
+        tokens, stdout_filepath = tokens[:position], tokens[position + 1]
+
+    argv = []
+    for token in tokens:
+        if token == '{sources}':
+            argv += list(sources)
+        elif token == '{destinations}':
+            argv += list(destinations)
+        elif token == '{pairs}':
+            argv += [path for pair in zip(sources, destinations) for path in pair]
+        else:
+            argv.append(token.replace('{source}', source).replace('{destination}', destination))
+    if stdout_filepath is not None:
+        stdout_filepath = stdout_filepath.replace('{source}', source).replace('{destination}', destination)
+    return argv, stdout_filepath
+
+
+class CommandPool:
+    '''
+    Runs argv lists (no shell), at most max_workers at a time across all callers and threads.
+    stderr is captured, and a command over its timeout is killed and raised as a CommandError
+    '''
+    def __init__(self, max_workers: int=None, timeout: float=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(self.max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def run(self, argv: List[str], stdout_filepath: str=None, timeout: float=None, stdout=subprocess.DEVNULL) -> subprocess.CompletedProcess:
+        '''
+        stdout goes to stdout_filepath if given, else to stdout (subprocess.PIPE to capture it)
+        '''
+        timeout = timeout if timeout is not None else self.timeout
+        with self.slots:
+            if stdout_filepath:
+                stdout = open(stdout_filepath, 'wb')
+            try:
+                return subprocess.run(argv, stdin=subprocess.DEVNULL, stdout=stdout, stderr=subprocess.PIPE, timeout=timeout)
+            except subprocess.TimeoutExpired as e:
+                raise CommandError(argv, None, (e.stderr or b'').decode(errors='replace')) from e
+            finally:
+                if stdout_filepath:
+                    stdout.close()
+
+    def submit(self, argv: List[str], stdout_filepath: str=None, timeout: float=None) -> Future:
+        return self.executor.submit(self.run, argv, stdout_filepath, timeout)
+
+
+_command_pools = {}
+
+
+def get_command_pool() -> CommandPool:
+    '''
+    One shared CommandPool per process
+    '''
+    pid = os.getpid()
+    if pid not in _command_pools:
+        _command_pools[pid] = CommandPool()
+    return _command_pools[pid]
+
+
+def main(argv: List[str]=None) -> int:
+    '''
+    Persistent batch helper, loads GDAL once and warps every pair:
+    python -m geoetl.cli gdalwarp [gdalwarp options] -- source1 destination1 source2 destination2 ...
+    '''
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != 'gdalwarp' or '--' not in argv:
+        print(main.__doc__, file=sys.stderr)
+        return 2
+
+    from osgeo import gdal
+    gdal.UseExceptions()
+    separator = argv.index('--')
+    options = gdal.WarpOptions(options=argv[1:separator])
+    paths = argv[separator + 1:]
+    failed = 0
+    for source, destination in zip(paths[::2], paths[1::2]):
+        try:
+            destination_ds = gdal.Warp(destination, source, options=options)
+            # Dereferencing flushes and closes the output
+            destination_ds = None
+        except Exception as e:
+            print(f'{source}: {e}', file=sys.stderr)
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
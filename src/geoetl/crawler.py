@@ -0,0 +1,169 @@
+import re
+import time
+import bisect
+import calendar
+import threading
+import bs4
+import htmllistparse
+from typing import List, Iterable
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .api import Index, Listing
+from .cache import DirectoryCache
+from .download import Downloader, get_downloader
+from .geoapi import ApacheListing
+
+
+# e.g. MRMS_MESH_00.50_20210801-120000.grib2.gz -> product MRMS_MESH_00.50, time 2021-08-01 12:00:00
+FILENAME_PATTERN = r'^(?P<product>.+?)_(?P<time>\d{8}-\d{6})\.'
+FILENAME_TIME_FORMAT = '%Y%m%d-%H%M%S'
+
+
+class ListingIndex:
+    '''
+    Listings grouped by product and sorted by time, for bisect lookups instead of a scan.
+    Product and time come from the filename (pattern, time_format); files that don't match
+    are filed under their directory with the listed modified time
+    '''
+    def __init__(self, pattern: str=FILENAME_PATTERN, time_format: str=FILENAME_TIME_FORMAT):
+        self.pattern = re.compile(pattern)
+        self.time_format = time_format
+        self.products = {}
+        self.is_sorted = True
+
+    def parse(self, listing: ApacheListing, directory: str=''):
+        match = self.pattern.match(listing.name)
+        if match is None:
+            return directory.rstrip('/'), listing.timestamp()
+        return match.group('product'), float(calendar.timegm(time.strptime(match.group('time'), self.time_format)))
+
+    def add(self, listing: ApacheListing, directory: str='') -> None:
+        product, timestamp = self.parse(listing, directory)
+        listing.product = product
+        listing.file_timestamp = timestamp
+        timestamps, listings = self.products.setdefault(product, ([], []))
+        timestamps.append(-1.0 if timestamp is None else timestamp)
+        listings.append(listing)
+        self.is_sorted = False
+
+    def sort(self) -> None:
+        for product, (timestamps, listings) in self.products.items():
+            order = sorted(range(len(listings)), key=lambda i: (timestamps[i], listings[i].url))
+            self.products[product] = ([timestamps[i] for i in order], [listings[i] for i in order])
+        self.is_sorted = True
+
+    def __len__(self) -> int:
+        return sum(len(listings) for _, listings in self.products.values())
+
+    def query(self, product: str=None, start: float=None, end: float=None, max_size: int=None) -> List[ApacheListing]:
+        '''
+        Listings of product (or of all products) with start <= time < end and size <= max_size, in time order
+        '''
+        if not self.is_sorted:
+            self.sort()
+
+        products = [product] if product is not None else list(self.products)
+        found = []
+        for name in products:
+            timestamps, listings = self.products.get(name, ([], []))
+            low = 0 if start is None else bisect.bisect_left(timestamps, start)
+            high = len(timestamps) if end is None else bisect.bisect_left(timestamps, end)
+            found += listings[low:high]
+
+        if max_size is not None:
+            found = [listing for listing in found if listing.size is not None and listing.size <= max_size]
+        if len(products) > 1:
+            found.sort(key=lambda listing: (listing.file_timestamp or -1.0, listing.url))
+        return found
+
+
+class ApacheCrawler:
+    '''
+    Walks an Apache directory tree, up to max_workers directory requests at a time.
+    With a DirectoryCache, listings are requested with If-Modified-Since/If-None-Match
+    and a 304 reuses the cached entries
+    '''
+    def __init__(self, url: str, max_workers: int=8, max_depth: int=None, cache: DirectoryCache=None, downloader: Downloader=None):
+        self.url = url if url.endswith('/') else url + '/'
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self.cache = cache
+        self.downloader = downloader
+        self.lock = threading.Lock()
+        self.failures = []
+
+    def fetch_directory(self, url: str) -> list:
+        '''
+        htmllistparse FileEntry objects of one directory
+        '''
+        headers = self.cache.conditional_headers(url) if self.cache is not None else {}
+        resp = (self.downloader or get_downloader()).get(url, headers=headers)
+        if resp.status_code == 304:
+            return [htmllistparse.FileEntry(name, None if modified is None else time.gmtime(modified), size, description)
+                    for name, modified, size, description in self.cache.entries_of(url)]
+
+        resp.raise_for_status()
+        _, entries = htmllistparse.parse(bs4.BeautifulSoup(resp.content, 'html5lib'))
+        if self.cache is not None:
+            with self.lock:
+                self.cache.update(url, resp.headers, [
+                    [entry.name, None if entry.modified is None else calendar.timegm(entry.modified), entry.size, entry.description]
+                    for entry in entries])
+        return entries
+
+    @staticmethod
+    def is_child(name: str) -> bool:
+        # Skip absolute, parent and query links
+        return bool(name) and not name.startswith(('/', '.', '?')) and '://' not in name
+
+    def crawl(self, listing_index: ListingIndex=None) -> ListingIndex:
+        listing_index = listing_index or ListingIndex()
+        self.failures = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(self.fetch_directory, self.url): (self.url, 0)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth = pending.pop(future)
+                    try:
+                        entries = future.result()
+                    except Exception as e:
+                        print(f'Failed {url}: {e!r}')
+                        self.failures.append((url, e))
+                        continue
+
+                    directory = url[len(self.url):]
+                    for entry in entries:
+                        if not self.is_child(entry.name):
+                            continue
+                        if entry.name.endswith('/'):
+                            if self.max_depth is None or depth < self.max_depth:
+                                pending[executor.submit(self.fetch_directory, url + entry.name)] = (url + entry.name, depth + 1)
+                        else:
+                            listing_index.add(ApacheListing(entry, url), directory)
+
+        if self.cache is not None:
+            self.cache.save()
+        return listing_index
+
+
+class ApacheTreeIndex(Index):
+    '''
+    Index over a whole Apache directory tree. Listings are narrowed with ListingIndex.query
+    using validator.query() before is_valid runs on what is left
+    '''
+    def __init__(self, *args, max_depth: int=None, directory_cache: DirectoryCache=None, **kwargs):
+        super(ApacheTreeIndex, self).__init__(*args, **kwargs)
+        self.max_depth = max_depth
+        self.directory_cache = directory_cache
+        self.listing_index = ListingIndex()
+
+    def fetch_listings(self):
+        crawler = ApacheCrawler(self.url, max_workers=self.max_workers, max_depth=self.max_depth,
+                                cache=self.directory_cache, downloader=self.downloader)
+        self.listing_index = crawler.crawl()
+        self.crawl_failures = crawler.failures
+        self.listings = self.listing_index.query()
+
+    def select_listings(self) -> Iterable[Listing]:
+        return filter(self.validator.is_valid, self.listing_index.query(**self.validator.query()))
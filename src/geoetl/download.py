@@ -0,0 +1,127 @@
+import os
+import time
+import requests
+from collections.abc import Callable
+from requests.adapters import HTTPAdapter
+from .metrics import Metrics, NullMetrics
+
+
+class DownloadError(Exception):
+    pass
+
+
+class Downloader:
+    '''
+    Shared HTTP client: a pooled keep-alive session, bodies streamed to disk in chunks,
+    bounded retries with exponential backoff, and HTTP Range resume of partial bodies.
+    Each download is recorded into metrics with its latency and size
+    '''
+    retry_statuses = (429, 500, 502, 503, 504)
+    retry_errors = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+    def __init__(self, pool_size: int=16, retries: int=3, backoff: float=0.5, chunk_size: int=2**16, timeout: float=30, metrics: Metrics=None):
+        self.metrics = metrics or NullMetrics()
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        '''
+        Single request with retries, for listings and headers
+        '''
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.retries + 1):
+            try:
+                resp = self.session.request(method, url, **kwargs)
+                if resp.status_code not in self.retry_statuses or attempt == self.retries:
+                    return resp
+            except self.retry_errors:
+                if attempt == self.retries:
+                    raise
+            self.sleep(attempt)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request('HEAD', url, **kwargs)
+
+    def download(self, url: str, filepath: str, headers: dict=None, resume: bool=False, accept: Callable=None) -> requests.Response:
+        '''
+        Stream url into filepath and return the response (headers only, the body is on disk).
+        accept is called with the response before any of the body is read; if it returns False,
+        or the server answers 304 Not Modified to conditional headers, None is returned and nothing is written.
+        After a dropped connection the next attempt asks for the remaining bytes with a Range header.
+        Bodies are requested without Content-Encoding, so bytes on disk are offsets into the resource;
+        a server that encodes anyway is restarted from the beginning instead of resumed.
+        With resume=True an existing partial file at filepath is continued the same way
+        '''
+        start = time.perf_counter()
+        try:
+            resp = self._download(url, filepath, headers, resume, accept)
+        except Exception as e:
+            self.metrics.record('download', url=url, seconds=time.perf_counter() - start, error=repr(e))
+            raise
+
+        written = os.path.getsize(filepath) if resp is not None and os.path.exists(filepath) else 0
+        self.metrics.record('download', url=url, seconds=time.perf_counter() - start, bytes=written,
+                            status=None if resp is None else resp.status_code)
+        return resp
+
+    def _download(self, url: str, filepath: str, headers: dict, resume: bool, accept: Callable) -> requests.Response:
+        headers = dict(headers or {})
+        # A decoded gzip body is longer than the bytes received, Range offsets count the encoded ones
+        headers.setdefault('Accept-Encoding', 'identity')
+        resumable = True
+        written = os.path.getsize(filepath) if resume and os.path.exists(filepath) else 0
+
+        for attempt in range(self.retries + 1):
+            request_headers = dict(headers, Range=f'bytes={written}-') if written else headers
+            try:
+                with self.session.get(url, headers=request_headers, stream=True, timeout=self.timeout) as resp:
+                    if resp.status_code == 304:
+                        return None
+                    if resp.status_code == 416 and written:
+                        # Nothing left to fetch
+                        return resp
+                    if resp.status_code in self.retry_statuses and attempt < self.retries:
+                        self.sleep(attempt)
+                        continue
+                    if resp.status_code >= 400:
+                        raise DownloadError(f'Failed request for {url}: {resp.status_code}')
+                    if not written and accept is not None and not accept(resp):
+                        return None
+                    # 206 continues the partial body, anything else starts over
+                    mode = 'ab' if resp.status_code == 206 else 'wb'
+                    resumable = resp.headers.get('Content-Encoding', 'identity') == 'identity'
+                    with open(filepath, mode) as f:
+                        for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                            f.write(chunk)
+                    return resp
+            except self.retry_errors as e:
+                if attempt == self.retries:
+                    raise DownloadError(f'Failed request for {url}: {e!r}') from e
+                written = os.path.getsize(filepath) if resumable and os.path.exists(filepath) else 0
+                self.sleep(attempt)
+
+    def sleep(self, attempt: int) -> None:
+        time.sleep(self.backoff * 2 ** attempt)
+
+
+_downloaders = {}
+
+
+def get_downloader() -> Downloader:
+    '''
+    One shared Downloader per process, so forked workers never share pooled sockets
+    '''
+    pid = os.getpid()
+    if pid not in _downloaders:
+        _downloaders[pid] = Downloader()
+    return _downloaders[pid]
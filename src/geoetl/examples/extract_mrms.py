@@ -1,8 +1,8 @@
 import sys
-import datetime
 from io import BytesIO
-from geoetl.geoapi import GDALWarpFactory
-from geoetl.api import Validator, Transformer, APISource, Transform, CLIBaseTransform, UnzipTransform
+from geoetl.geoapi import GDALWarpFactory, LoadNetcdf
+from geoetl.rules import RuleValidator, ContentType, SizeCap, DateWindow
+from geoetl.api import Transformer, APISource, Transform, CLIBaseTransform, UnzipTransform, GunzipTransform
 
 
 class Application:
@@ -16,40 +16,39 @@ class Application:
         return self.some_external_call()
 
 
-class SimpleValidator(Validator):
+class SimpleValidator(RuleValidator):
     def __init__(self, application):
         self.state = application
-    
-    def is_resp_valid(self, resp):
+        super(SimpleValidator, self).__init__([
+            # Enforce GZip
+            ContentType('application/x-gzip'),
+            # Enforce <1MB
+            SizeCap(10**6, allow_unknown=True),
+            # Enforce date in sync
+            DateWindow.day()])
+
+    def is_header_valid(self, headers):
         # Integrate app as needed
         if not self.state.is_needed():
             return False
-        # Enforce GZip
-        if resp.headers['Content-Type'] != 'application/x-gzip':
-            return False
-        # Enforce <1MB
-        if int(resp.headers['Content-Length']) > 10**6:
-            return False
-        # Enforce date in sync
-        if datetime.datetime.utcnow().strftime('%d %b') not in resp.headers['Last-Modified']:
-            return False
-
-        return True
+        return super(SimpleValidator, self).is_header_valid(headers)
 
 
 def main():
     '''
-    Call NOAA api, transform to gzipped netcdf
+    Call NOAA api, transform to zlib-compressed netcdf
     '''
     GDALWarpUngrib = GDALWarpFactory.make('GDALWarpUngrib')
-    ZipTransform = CLIBaseTransform.make(name='ZipTransform', executable='gzip', command='gzip -c {source} > {destination}')
 
     simple_mrms = APISource(
         url='https://mrms.ncep.noaa.gov/data/2D/MESH/MRMS_MESH.latest.grib2.gz',
         validator=SimpleValidator(Application(None)),
         transformer=Transformer(
-            transforms=[UnzipTransform, GDALWarpUngrib, ZipTransform])).transform()
+            transforms=[GunzipTransform, GDALWarpUngrib, LoadNetcdf], stream=True)).transform()
 
+    if simple_mrms is None:
+        print('No valid product downloaded')
+        return None
     print('Output filepath: ' + simple_mrms.filepath)
     return simple_mrms
 
@@ -1,28 +1,23 @@
+import os
 import sys
 import s3fs
-import datetime
 import numpy as np
 from io import BytesIO
-from geoetl.geoapi import GDALWarpFactory, LoadNetcdf, xarray_sum
-from geoetl.api import Validator, Transformer, FileNode, APISource, Transform, CLIBaseTransform, UnzipTransform, ApacheIndex
+from geoetl.geoapi import GDALWarpFactory, LoadNetcdf, SumAccumulator, ApacheIndex
+from geoetl.cache import ListingManifest, NodeCache
+from geoetl.rolling import RollingAggregator
+from geoetl.rules import RuleValidator, SizeCap, DateWindow
+from geoetl.api import Transformer, FileNode, APISource, Transform, CLIBaseTransform, UnzipTransform, GunzipTransform
 
 
-class NOAAValidator(Validator):
+class NOAAValidator(RuleValidator):
     def __init__(self):
-        self.date = datetime.datetime.utcnow()
-
-    def is_valid(self, listing) -> bool:
-        # Enforce <1MB
-        if int(listing.size) > 2*10**6:
-            print('oversize')
-            return False
-        
-        # Enforce date in sync
-        month, day = self.date.month, self.date.day
-        if month != listing.modified.tm_mon and day != listing.modified.tm_mday:
-            print('Not today')
-            return False
-        return True
+        # Evaluated over the whole listing at once, rejects are counted per rule in .rejected
+        super(NOAAValidator, self).__init__([
+            # Enforce <2MB
+            SizeCap(2*10**6),
+            # Enforce date in sync
+            DateWindow.day()])
 
 
 def main():
@@ -31,19 +26,47 @@ def main():
     If one arg is given to get_aggregate, it will be called on the list of nodes, i.e. xarray_aggregator(nodes)
     If given two args, the first will be called as the reducer and second fed into the reducer
     i.e. reduce(noaa_aggregator, list)
+    An Accumulator instance is instead fed each node as it is transformed
     '''
 
     GDALWarpUngrib = GDALWarpFactory.make('GDALWarpUngrib')
-    ZipTransform = CLIBaseTransform.make(name='ZipTransform', executable='gzip', command='gzip -c {source} > {destination}')
 
+    # Listings transformed on a previous run are served from the cache
+    etl_dir = os.environ.get('ETL_DIR', './')
     aggregated_node = ApacheIndex(
         url='https://mrms.ncep.noaa.gov/data/2D/MESH',
         validator=NOAAValidator(),
         transformer=Transformer(
-            transforms=[UnzipTransform, GDALWarpUngrib, LoadNetcdf])).get_aggregate(xarray_sum)
+            transforms=[GunzipTransform, GDALWarpUngrib, LoadNetcdf],
+            cache=NodeCache(os.path.join(etl_dir, 'cache'))),
+        manifest=ListingManifest(os.path.join(etl_dir, 'manifest.json'))).get_aggregate(SumAccumulator())
     
     print('Output filepath: ' + aggregated_node.filepath)
 
 
+def rolling_main(hours=6):
+    '''
+    Scheduled variant of main: keep a "last N hours" sum on disk, each run only
+    transforms the listings that appeared since the previous one
+    '''
+    GDALWarpUngrib = GDALWarpFactory.make('GDALWarpUngrib')
+
+    etl_dir = os.environ.get('ETL_DIR', './')
+    index = ApacheIndex(
+        url='https://mrms.ncep.noaa.gov/data/2D/MESH',
+        validator=NOAAValidator(),
+        transformer=Transformer(transforms=[GunzipTransform, GDALWarpUngrib, LoadNetcdf]),
+        manifest=ListingManifest(os.path.join(etl_dir, 'rolling_manifest.json')))
+    rolling = RollingAggregator(os.path.join(etl_dir, 'rolling'), window=hours * 3600)
+
+    index.fetch_listings()
+    for node in index.iter_transform_index(new_only=True):
+        rolling.add(node)
+        node.truncate()
+
+    aggregated_node = rolling.result()
+    print('Output filepath: ' + aggregated_node.filepath)
+
+
 if __name__ == '__main__':
     sys.exit(main())
@@ -1,20 +1,30 @@
 import os
-import json
+import sys
+import time
+import uuid
+import shlex
+import shutil
+import calendar
+import functools
+import multiprocessing
+import bs4
 import htmllistparse
 import numpy as np
 import xarray as xr
-from typing import List, Dict, Type
+from typing import List, Dict, Type, Tuple, Iterator, Iterable
+from collections.abc import Callable
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 from .api import Transform, FileNode, CLIBaseTransform, Listing, Index
+from .metadata import RasterMetadata, gdalinfo, get_metadata
 from .utils import get_temp_file
+from .download import get_downloader
 
-
-def gdalinfo(filepath: str) -> Dict:
-    dest_fp = get_temp_file()
-    os.system(f'gdalinfo -json {filepath} > {dest_fp}')
-    with open(dest_fp, 'r') as f:
-        file_gdalinfo = json.load(f)
-    os.remove(dest_fp)
-    return file_gdalinfo
+try:
+    from osgeo import gdal
+    gdal.UseExceptions()
+except ImportError:
+    gdal = None
 
 
 class GDALWarpBase(CLIBaseTransform):
@@ -24,6 +34,92 @@ class GDALWarpBase(CLIBaseTransform):
     def __init__(self, *args, **kwargs):
         super(GDALWarpBase, self).__init__(*args, **kwargs)
 
+    # Values taken by the options that are dropped or replaced when deriving other warps from command
+    option_arity = {'-of': 1, '-co': 1, '-te': 4, '-ts': 2, '-tr': 2}
+
+    @classmethod
+    def command_options(cls, exclude: Tuple[str, ...]=()) -> List[str]:
+        '''
+        gdalwarp options of command, without the exclude flags and their values
+        '''
+        args = [arg for arg in shlex.split(cls.command)[1:] if arg not in ('{source}', '{destination}')]
+        options, i = [], 0
+        while i < len(args):
+            if args[i] in exclude:
+                i += 1 + cls.option_arity.get(args[i], 0)
+                continue
+            options.append(args[i])
+            i += 1
+        return options
+
+    @classmethod
+    def batch_argv(cls, sources: List[str], destinations: List[str]) -> List[str]:
+        '''
+        With the bindings installed, one geoetl.cli helper process warps the whole batch
+        '''
+        if gdal is None:
+            return super(GDALWarpBase, cls).batch_argv(sources, destinations)
+        pairs = [path for pair in zip(sources, destinations) for path in pair]
+        return [sys.executable, '-m', 'geoetl.cli', 'gdalwarp', *cls.command_options(), '--', *pairs]
+
+
+@contextmanager
+def open_gdal_dataset(node: FileNode):
+    '''
+    In-memory nodes are opened through /vsimem/ without touching disk
+    '''
+    if not node.in_memory:
+        yield gdal.Open(node.filepath)
+        return
+
+    vsimem_path = f'/vsimem/{uuid.uuid4().hex}'
+    gdal.FileFromMemBuffer(vsimem_path, node.content.getvalue())
+    try:
+        yield gdal.Open(vsimem_path)
+    finally:
+        gdal.Unlink(vsimem_path)
+
+
+class GDALWarpInProcess(GDALWarpBase):
+    '''
+    Same warp as GDALWarpBase.command, run through osgeo.gdal.Warp in this process.
+    Parsed options, including the output grid, are cached per source grid, so
+    same-grid files skip option parsing and the suggested-output computation
+    '''
+    in_memory_source = True
+    _warp_options = {}
+
+    def transform(self) -> FileNode:
+        destination_filepath = self.get_temp_file()
+        with open_gdal_dataset(self.source_node) as source_ds:
+            destination_ds = gdal.Warp(destination_filepath, source_ds, options=self.warp_options(source_ds))
+            if destination_ds is None:
+                raise Exception(f'{type(self).__name__} failed')
+            # Dereferencing flushes and closes the output
+            destination_ds = None
+        return FileNode(filepath=destination_filepath)
+
+    @classmethod
+    def target_grid(cls, source_ds):
+        '''
+        Output bounds, width, height and projection gdalwarp picks for source_ds, through a virtual warp
+        '''
+        vrt_ds = gdal.Warp('', source_ds, options=gdal.WarpOptions(options=cls.command_options(exclude=('-of', '-co')) + ['-of', 'VRT']))
+        x_min, x_res, _, y_max, _, y_res = vrt_ds.GetGeoTransform()
+        width, height = vrt_ds.RasterXSize, vrt_ds.RasterYSize
+        projection = vrt_ds.GetProjection()
+        vrt_ds = None
+        return [x_min, y_max + y_res * height, x_min + x_res * width, y_max], width, height, projection
+
+    @classmethod
+    def warp_options(cls, source_ds):
+        signature = (cls.command, source_ds.GetProjection(), source_ds.GetGeoTransform(), source_ds.RasterXSize, source_ds.RasterYSize)
+        if signature not in cls._warp_options:
+            bounds, width, height, _ = cls.target_grid(source_ds)
+            grid = ['-te'] + [repr(bound) for bound in bounds] + ['-ts', str(width), str(height)]
+            cls._warp_options[signature] = gdal.WarpOptions(options=cls.command_options(exclude=('-te', '-ts', '-tr')) + grid)
+        return cls._warp_options[signature]
+
 
 class GDALWarpFactory:
 
@@ -35,7 +131,7 @@ class GDALWarpFactory:
     def search_process(cls, name) -> str:
         process = name
         if name not in cls._process_mapping:
-            keys = [k for k, v in cls._process_mapping.items() if name == v.__name__]
+            keys = [k for k, v in cls._process_mapping.items() if name == v[0]]
             if keys:
                 process = keys[0]
             else:
@@ -43,62 +139,150 @@ class GDALWarpFactory:
         return process
     
     @classmethod
-    def make(cls, name: str) -> Type[GDALWarpBase]:
+    def make(cls, name: str, engine: str='') -> Type[GDALWarpBase]:
+        '''
+        engine is 'gdal' (in-process bindings), 'indexed' (reproject.GDALWarpIndexed, cached
+        nearest-neighbour index) or 'cli' (gdalwarp subprocess), by default bindings are used when osgeo is importable
+        '''
         # Find out what "name" refers to
         process = cls.search_process(name)
         if not process:
             raise Exception('Process/Transform not found')
+
+        engine = engine or ('gdal' if cls.has_bindings() else 'cli')
+        if engine != 'cli' and not cls.has_bindings():
+            raise Exception('GDAL Python bindings (osgeo) not found')
+
+        base = GDALWarpBase
+        if engine == 'gdal':
+            base = GDALWarpInProcess
+        elif engine == 'indexed':
+            from .reproject import GDALWarpIndexed
+            base = GDALWarpIndexed
         
         return type(
             process, 
-            (GDALWarpBase,),
+            (base,),
             {'command': cls._process_mapping[process][1]})
 
     @classmethod
     def list_all_funcs(cls) -> Dict[str, str]:
-        return {k: v.__name__ for k, v in cls._process_mapping.items()}
+        return {k: v[0] for k, v in cls._process_mapping.items()}
+
+    @staticmethod
+    def has_bindings() -> bool:
+        return gdal is not None
     
     @staticmethod
     def check_installation() -> bool:
-        cmd = os.system(f'gdalwarp --version')
-        exit_code = os.WEXITSTATUS(cmd)
-        if exit_code:
+        if shutil.which('gdalwarp') is None:
             print(f'Gdalwarp binary not found, please install and put in PATH')
             return False
         return True
 
 
+class NetcdfWriter:
+    '''
+    to_netcdf with an explicit encoding for every grid variable (2 or more dims): zlib/shuffle compression,
+    chunks of chunk_rows full-width rows (chunk_cols to split them), and optional packing into an
+    integer dtype with scale_factor/add_offset. Compressed output makes a separate gzip step unnecessary
+    '''
+    def __init__(self, zlib: bool=True, complevel: int=4, shuffle: bool=True, chunk_rows: int=256, chunk_cols: int=None,
+                 dtype=None, scale_factor: float=None, add_offset: float=None, fill_value=None):
+        self.zlib = zlib
+        self.complevel = complevel
+        self.shuffle = shuffle
+        self.chunk_rows = chunk_rows
+        self.chunk_cols = chunk_cols
+        self.dtype = dtype
+        self.scale_factor = scale_factor
+        self.add_offset = add_offset
+        self.fill_value = fill_value
+
+    def chunksizes(self, shape) -> tuple:
+        rows, cols = shape[-2:]
+        return (1,) * (len(shape) - 2) + (min(self.chunk_rows, rows), min(self.chunk_cols or cols, cols))
+
+    def variable_encoding(self, variable) -> Dict:
+        encoding = {'zlib': self.zlib, 'complevel': self.complevel, 'shuffle': self.shuffle, 'chunksizes': self.chunksizes(variable.shape)}
+        if self.dtype is not None:
+            encoding['dtype'] = np.dtype(self.dtype)
+            if np.issubdtype(encoding['dtype'], np.integer):
+                encoding['_FillValue'] = np.iinfo(encoding['dtype']).min if self.fill_value is None else self.fill_value
+        if self.scale_factor is not None:
+            encoding['scale_factor'] = self.scale_factor
+        if self.add_offset is not None:
+            encoding['add_offset'] = self.add_offset
+        return encoding
+
+    def encoding(self, xr_dataset) -> Dict:
+        return {name: self.variable_encoding(variable) for name, variable in xr_dataset.data_vars.items() if variable.ndim >= 2}
+
+    def write(self, xr_dataset, destination_filepath: str) -> None:
+        xr_dataset.to_netcdf(destination_filepath, engine='netcdf4', encoding=self.encoding(xr_dataset))
+
+
 class NetcdfTransform(Transform):
     '''
-    For netCDF -> netCDF and netCDF -> X operations
+    For netCDF -> netCDF and netCDF -> X operations.
+    Bands are processed lazily in blocks of chunk_rows rows through dask and written block by block,
+    so peak memory follows the block size rather than the grid size. Output is written through writer
+    Source metadata (see metadata.get_metadata) is read on first access, constructing a transform does no I/O
     '''
+    chunk_rows = 256
+    writer = NetcdfWriter()
+
     def __init__(self, *args, **kwargs):
-        super(LoadNetcdf, self).__init__(*args, **kwargs)
-        self.file_gdalinfo = gdalinfo(self.source_filepath)
-        try:
-            self.bands = [band['metadata']['']['NETCDF_VARNAME'] for band in self.file_gdalinfo['bands']]
-        except:
-            self.bands = ['Band1']
-        if not self.bands:
-            raise ValueError('No NetCDF bands found')
-    
+        super(NetcdfTransform, self).__init__(*args, **kwargs)
+        self._bands = None
+
+    @property
+    def metadata(self) -> RasterMetadata:
+        return get_metadata(self.source_filepath)
+
+    @property
+    def bands(self) -> List[str]:
+        if self._bands is None:
+            if not self.metadata.bands:
+                raise ValueError('No NetCDF bands found')
+            self._bands = list(self.metadata.bands)
+        return self._bands
+
+    @bands.setter
+    def bands(self, bands: List[str]) -> None:
+        self._bands = bands
+
     def transform(self):
-        band = self.source_node.metadata.get('band', 'Band1')
-        source_xr = self.get_xr_dataset(self.source_filepath)
-        for band in self.bands:
-            band_ref = get_band_ref(source_xr, band)
-            band_ref.values = self.get_absolute(band_ref)
-        
         destination_filepath = self.get_temp_file()
-        source_xr.to_netcdf(destination_filepath)
+        with self.get_xr_dataset(self.source_filepath) as source_xr:
+            self.writer.write(self.get_absolute_chunked(source_xr, self.bands, self.chunk_rows), destination_filepath)
         return FileNode(filepath=destination_filepath)
-    
+
+    @classmethod
+    def get_absolute_chunked(cls, xr_dataset, bands: List[str], chunk_rows: int=256):
+        '''
+        Lazy get_absolute of each band, one block of rows at a time
+        '''
+        for band in bands:
+            band_ref = cls.get_band_ref(xr_dataset, band)
+            # Rows are the second to last axis, e.g. (time, lat, lon) grids have a length 1 time axis first
+            rows = band_ref.dims[-2] if band_ref.ndim > 1 else band_ref.dims[0]
+            chunked = band_ref.chunk({rows: chunk_rows}).data
+            xr_dataset[band] = band_ref.copy(data=chunked.map_blocks(cls.absolute, dtype=np.uint8))
+        return xr_dataset
+
     @staticmethod
-    def get_absolute(band_ref):
-        source_np = np.array(band_ref.values[:,:])
-        source_np[source_np < 0] = 0
-        source_np = source_np.astype(np.uint8)
-        return source_np
+    def absolute(values: np.ndarray) -> np.ndarray:
+        '''
+        Clamps negatives to 0 in place (values must be writable) and casts to uint8, missing values become 0
+        '''
+        np.maximum(values, 0, out=values)
+        np.nan_to_num(values, copy=False)
+        return values.astype(np.uint8)
+
+    @classmethod
+    def get_absolute(cls, band_ref):
+        return cls.absolute(np.array(band_ref.values))
 
     @staticmethod
     def get_band_ref(xr_dataset, band='Band1'):
@@ -116,38 +300,157 @@ class NetcdfTransform(Transform):
             engine='netcdf4', concat_dim='t', combine='nested', chunks=8)
 
 
+LoadNetcdf = NetcdfTransform
+
+
 class ApacheListing(Listing):
-    def __init__(self, listing, base_url: str):
-        self.name = listing.name
-        self.modified = listing.modified
-        self.size = listing.size
-        self.description = listing.description
-        self.base_url = base_url
+    '''
+    One entry of an Apache directory listing. Slots, an interned base_url and a url built on access
+    keep large indexes small; modified is derived from the epoch seconds
+    '''
+    __slots__ = ('name', 'epoch', 'size', 'description', 'base_url', 'product', 'file_timestamp')
+
+    def __init__(self, listing=None, base_url: str='', name: str='', epoch: int=None, size: int=None, description: str=None):
+        if listing is not None:
+            name, size, description = listing.name, listing.size, listing.description
+            epoch = calendar.timegm(listing.modified) if listing.modified else None
+        self.name = name
+        self.epoch = epoch
+        self.size = size
+        self.description = description
+        self.base_url = sys.intern(base_url if base_url.endswith('/') else base_url + '/')
+        self.product = None
+        self.file_timestamp = None
+
+    @property
+    def url(self) -> str:
+        return self.base_url + self.name
+
+    def __getstate__(self) -> Dict:
+        # The default slot pickling would also try to restore the url property
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state: Dict) -> None:
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    @property
+    def modified(self) -> time.struct_time:
+        return time.gmtime(self.epoch) if self.epoch is not None else None
+
+    def key(self) -> str:
+        modified = time.strftime('%Y-%m-%dT%H:%M:%S', self.modified) if self.epoch is not None else ''
+        return f'{self.url}|{self.size}|{modified}'
 
-        if base_url[-1] != '/':
-            base_url += '/'
-        self.url = base_url + self.name
+    def timestamp(self) -> float:
+        return self.epoch
 
     @classmethod
     def format(cls, listings, url: str) -> List[Listing]:
         return [cls(listing=listing, base_url=url) for listing in listings]
 
 
+class ListingStore:
+    '''
+    Columnar listings of one or more directories: names, epoch seconds (NaN if unknown) and sizes (-1 if unknown)
+    as NumPy arrays, and the row's directory as an index into interned base_urls.
+    ApacheListing objects are only built for the rows that are read, and vectorized predicates
+    (see size_cap, date_window and Validator.mask) select rows over the whole store at once
+    '''
+    def __init__(self, names: List[str]=None, epochs=None, sizes=None, directories=None, base_urls: List[str]=None, descriptions: Dict[int, str]=None):
+        self.names = names or []
+        self.epochs = np.asarray(epochs if epochs is not None else [], dtype=np.float64)
+        self.sizes = np.asarray(sizes if sizes is not None else [], dtype=np.int64)
+        self.directories = np.asarray(directories if directories is not None else [], dtype=np.int32)
+        self.base_urls = base_urls or []
+        # Apache descriptions are nearly always empty, only the others are kept
+        self.descriptions = descriptions or {}
+
+    @classmethod
+    def from_entries(cls, entries, base_url: str) -> 'ListingStore':
+        '''
+        entries are htmllistparse FileEntry objects of the directory at base_url
+        '''
+        count = len(entries)
+        epochs = np.full(count, np.nan)
+        sizes = np.full(count, -1, dtype=np.int64)
+        descriptions = {}
+        for i, entry in enumerate(entries):
+            if entry.modified:
+                epochs[i] = calendar.timegm(entry.modified)
+            if entry.size is not None:
+                sizes[i] = entry.size
+            if entry.description:
+                descriptions[i] = entry.description
+
+        base_url = sys.intern(base_url if base_url.endswith('/') else base_url + '/')
+        return cls([entry.name for entry in entries], epochs, sizes, np.zeros(count, dtype=np.int32), [base_url], descriptions)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, i: int) -> ApacheListing:
+        return self.listing(i)
+
+    def __iter__(self) -> Iterator[ApacheListing]:
+        return (self.listing(i) for i in range(len(self)))
+
+    def url(self, i: int) -> str:
+        return self.base_urls[self.directories[i]] + self.names[i]
+
+    def listing(self, i: int) -> ApacheListing:
+        epoch, size = self.epochs[i], self.sizes[i]
+        return ApacheListing(
+            base_url=self.base_urls[self.directories[i]], name=self.names[i], epoch=None if np.isnan(epoch) else int(epoch),
+            size=None if size < 0 else int(size), description=self.descriptions.get(i))
+
+    def listings(self, mask: np.ndarray=None) -> List[ApacheListing]:
+        rows = range(len(self)) if mask is None else np.flatnonzero(mask)
+        return [self.listing(i) for i in rows]
+
+
+def size_cap(max_size: int) -> Callable:
+    '''
+    Predicate over a ListingStore: rows with a known size of at most max_size bytes
+    '''
+    return lambda store: (store.sizes >= 0) & (store.sizes <= max_size)
+
+
+def date_window(start: float=None, end: float=None) -> Callable:
+    '''
+    Predicate over a ListingStore: rows modified in [start, end), epoch seconds
+    '''
+    def predicate(store: ListingStore) -> np.ndarray:
+        mask = ~np.isnan(store.epochs)
+        if start is not None:
+            mask &= store.epochs >= start
+        if end is not None:
+            mask &= store.epochs < end
+        return mask
+    return predicate
+
+
 class ApacheIndex(Index):
     '''
-    ETL Connector for NOAA Apache servers
+    ETL Connector for NOAA Apache servers.
+    Listings are kept in a ListingStore, validator.mask narrows them before is_valid
     '''
     def fetch_listings(self):
-        cwd, listings = htmllistparse.fetch_listing(self.url, timeout=30)
+        resp = (self.downloader or get_downloader()).get(self.url, timeout=30)
+        resp.raise_for_status()
+        cwd, listings = htmllistparse.parse(bs4.BeautifulSoup(resp.content, 'html5lib'))
         self.cwd = cwd
-        self.listings = ApacheListing.format(listings, self.url)
+        self.listings = ListingStore.from_entries(listings, self.url)
+
+    def select_listings(self) -> Iterable[Listing]:
+        return self.validator.select(self.listings)
 
     def get_aggregate(self, aggregator, *args, **kwargs) -> FileNode:
         self.fetch_listings()
         return self.aggregate(aggregator, *args, **kwargs)
 
 
-def xr_mf_sum(nodes: List[FileNode]) -> FileNode:
+def xr_mf_sum(nodes: List[FileNode], writer: NetcdfWriter=None) -> FileNode:
     '''
     Return sum of "band" over all netCDF FileNodes 
     '''
@@ -159,16 +462,200 @@ def xr_mf_sum(nodes: List[FileNode]) -> FileNode:
     latest_band_ref = NetcdfTransform.get_band_ref(latest_xr, band)
 
     # Insert summed result of "band" into latest xr
-    sum_band_ref = NetcdfTransform.get_band_ref(mf_xr.sum('z'), band)
+    sum_band_ref = NetcdfTransform.get_band_ref(mf_xr.sum('t'), band)
     latest_band_ref.values = NetcdfTransform.get_absolute(sum_band_ref)
 
     destination_filepath = get_temp_file()
-    latest_xr.to_netcdf(destination_filepath)
+    (writer or NetcdfTransform.writer).write(latest_xr, destination_filepath)
     return FileNode(filepath=destination_filepath)
 
 
+def read_band(filepath: str, band: str='Band1') -> np.ndarray:
+    with NetcdfTransform.get_xr_dataset(filepath) as source_xr:
+        return np.asarray(NetcdfTransform.get_band_ref(source_xr, band).values)
+
+
+def write_band(template_filepath: str, band: str, values: np.ndarray, writer: NetcdfWriter=None) -> FileNode:
+    '''
+    Copy of the template netCDF with "band" replaced by the absolute values of a grid
+    '''
+    with NetcdfTransform.get_xr_dataset(template_filepath) as template_xr:
+        band_ref = NetcdfTransform.get_band_ref(template_xr, band)
+        band_ref.values = NetcdfTransform.get_absolute(xr.DataArray(values))
+
+        destination_filepath = get_temp_file()
+        (writer or NetcdfTransform.writer).write(template_xr, destination_filepath)
+    return FileNode(filepath=destination_filepath)
+
+
+class Accumulator:
+    '''
+    Running reduction of "band" over netCDF FileNodes, folded one file at a time as they arrive.
+    Memory stays at one grid, the latest node is kept as the template for the output file.
+    Pass an instance to Index.aggregate to fold nodes while the rest of the index is still transforming
+    '''
+    def __init__(self, band: str='Band1', dtype=np.float64, remove_nodes: bool=False, writer: NetcdfWriter=None):
+        self.band = band
+        self.dtype = dtype
+        self.remove_nodes = remove_nodes
+        self.writer = writer
+        self.values = None
+        self.template = None
+        self.count = 0
+
+    def fold(self, values: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def prepare(self, values: np.ndarray) -> np.ndarray:
+        '''
+        One grid as read from a file -> what fold combines, missing values count as 0 by default
+        '''
+        return np.nan_to_num(values).astype(self.dtype, copy=False)
+
+    def finalize(self, values: np.ndarray) -> np.ndarray:
+        '''
+        Folded values -> the grid written by result()
+        '''
+        return values
+
+    def add(self, node: FileNode) -> None:
+        values = self.prepare(read_band(node.filepath, self.band))
+
+        if self.values is None:
+            self.values = values
+        else:
+            self.fold(values)
+
+        if self.remove_nodes and self.template is not None:
+            self.template.truncate()
+        self.template = node
+        self.count += 1
+
+    def save_partial(self, filepath: str) -> str:
+        '''
+        Running values and count, losslessly (result() writes the absolute uint8 band), see add_partial
+        '''
+        np.savez(filepath, values=self.values, count=self.count)
+        return filepath
+
+    def add_partial(self, filepath: str, template_filepath: str) -> None:
+        '''
+        Folds in a partial aggregate saved by another Accumulator of the same kind
+        '''
+        with np.load(filepath) as partial:
+            values = partial['values'].astype(self.dtype, copy=False)
+            count = int(partial['count'])
+
+        if self.values is None:
+            self.values = values
+        else:
+            self.fold(values)
+        if self.template is None:
+            self.template = FileNode(filepath=template_filepath)
+        self.count += count
+
+    def result(self) -> FileNode:
+        if self.template is None:
+            raise ValueError('No nodes were aggregated')
+
+        result_node = write_band(self.template.filepath, self.band, self.finalize(self.values), self.writer)
+        if self.remove_nodes:
+            self.template.truncate()
+        return result_node
+
+
+class SumAccumulator(Accumulator):
+    def fold(self, values: np.ndarray) -> None:
+        np.add(self.values, values, out=self.values)
+
+
+class MaxAccumulator(Accumulator):
+    '''
+    Missing values are ignored unless a pixel has nothing else
+    '''
+    def prepare(self, values: np.ndarray) -> np.ndarray:
+        return values.astype(self.dtype, copy=False)
+
+    def fold(self, values: np.ndarray) -> None:
+        np.fmax(self.values, values, out=self.values)
+
+
+class MinAccumulator(MaxAccumulator):
+    def fold(self, values: np.ndarray) -> None:
+        np.fmin(self.values, values, out=self.values)
+
+
+class CountAccumulator(SumAccumulator):
+    '''
+    Number of valid (non-missing) values per pixel
+    '''
+    def prepare(self, values: np.ndarray) -> np.ndarray:
+        return (~np.isnan(values)).astype(self.dtype)
+
+
+class MeanAccumulator(SumAccumulator):
+    '''
+    Mean of the valid values per pixel, folded as a stacked [sum, count] so partials combine exactly
+    '''
+    def prepare(self, values: np.ndarray) -> np.ndarray:
+        return np.stack([np.nan_to_num(values), ~np.isnan(values)]).astype(self.dtype, copy=False)
+
+    def finalize(self, values: np.ndarray) -> np.ndarray:
+        total, count = values
+        return np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+
+
+def _reduce_partition(make_accumulator: Callable, filepaths: List[str]) -> Tuple[str, str]:
+    accumulator = make_accumulator()
+    for filepath in filepaths:
+        accumulator.add(FileNode(filepath=filepath))
+    return accumulator.save_partial(get_temp_file(prefix='partial') + '.npz'), accumulator.template.filepath
+
+
+def _combine_partials(make_accumulator: Callable, partials: List[Tuple[str, str]]) -> Tuple[str, str]:
+    accumulator = make_accumulator()
+    for partial_filepath, template_filepath in partials:
+        accumulator.add_partial(partial_filepath, template_filepath)
+        os.remove(partial_filepath)
+    return accumulator.save_partial(get_temp_file(prefix='partial') + '.npz'), accumulator.template.filepath
+
+
+def tree_reduce(nodes: List[FileNode], make_accumulator: Callable=SumAccumulator, partitions: int=None, fan_in: int=4, max_workers: int=None) -> FileNode:
+    '''
+    Parallel aggregation of nodes with an associative Accumulator (Sum, Max, Min, Count, Mean).
+    The node list is split into partitions, each folded into a lossless partial by a separate process
+    with one grid in memory at a time; the partials are then combined fan_in at a time, level by level,
+    until one is left. make_accumulator must be picklable, e.g. a class or functools.partial
+    '''
+    if not nodes:
+        raise ValueError('No nodes to aggregate')
+    max_workers = max_workers or os.cpu_count() or 1
+    partitions = min(partitions or max_workers, len(nodes))
+    filepaths = [node.filepath for node in nodes]
+    bounds = np.linspace(0, len(filepaths), partitions + 1).astype(int)
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('fork')) as executor:
+        partials = list(executor.map(_reduce_partition, [make_accumulator] * partitions,
+                                     [filepaths[start:end] for start, end in zip(bounds[:-1], bounds[1:])]))
+        while len(partials) > 1:
+            groups = [partials[i:i + fan_in] for i in range(0, len(partials), fan_in)]
+            partials = list(executor.map(_combine_partials, [make_accumulator] * len(groups), groups))
+
+    accumulator = make_accumulator()
+    accumulator.add_partial(*partials[0])
+    os.remove(partials[0][0])
+    return accumulator.result()
+
+
 def xarray_sum(nodes, mode='dim'):
     if mode == 'dim':
         return xr_mf_sum(nodes)
+    if mode == 'stream':
+        accumulator = SumAccumulator(band=nodes[0].metadata.get('band', 'Band1'))
+        for node in nodes:
+            accumulator.add(node)
+        return accumulator.result()
+    if mode == 'tree':
+        return tree_reduce(nodes, functools.partial(SumAccumulator, band=nodes[0].metadata.get('band', 'Band1')))
 
 
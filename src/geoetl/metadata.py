@@ -0,0 +1,99 @@
+import os
+import json
+import functools
+import subprocess
+import netCDF4
+from typing import Dict, Tuple, NamedTuple
+from .cli import CommandError, get_command_pool
+
+try:
+    from osgeo import gdal
+    gdal.UseExceptions()
+except ImportError:
+    gdal = None
+
+
+class RasterMetadata(NamedTuple):
+    '''
+    Header of one raster file. bands are netCDF variable names (GDAL's NETCDF_VARNAME) or Band1..N,
+    geotransform is GDAL's north-up (x_min, x_res, 0, y_max, 0, -y_res), None if not georeferenced
+    '''
+    driver: str
+    bands: Tuple[str, ...]
+    shape: Tuple[int, ...]
+    geotransform: Tuple[float, ...]
+    projection: str
+
+
+def gdalinfo(filepath: str) -> Dict:
+    if gdal is not None:
+        return gdal.Info(filepath, format='json')
+
+    argv = ['gdalinfo', '-json', filepath]
+    completed = get_command_pool().run(argv, stdout=subprocess.PIPE)
+    if completed.returncode != 0:
+        raise CommandError(argv, completed.returncode, completed.stderr.decode(errors='replace'))
+    return json.loads(completed.stdout)
+
+
+def netcdf_geotransform(dataset, variable) -> Tuple[float, ...]:
+    grid_mapping = dataset.variables.get(getattr(variable, 'grid_mapping', ''))
+    if grid_mapping is not None and hasattr(grid_mapping, 'GeoTransform'):
+        return tuple(float(value) for value in grid_mapping.GeoTransform.split())
+
+    # Otherwise from the 1-d coordinate variables of the last two dims, assumed regular
+    y_name, x_name = variable.dimensions[-2:]
+    if x_name not in dataset.variables or y_name not in dataset.variables:
+        return None
+    x, y = dataset.variables[x_name][:], dataset.variables[y_name][:]
+    if x.ndim != 1 or y.ndim != 1 or len(x) < 2 or len(y) < 2:
+        return None
+    x_res = float(x[-1] - x[0]) / (len(x) - 1)
+    y_res = abs(float(y[-1] - y[0])) / (len(y) - 1)
+    return (float(x[0]) - x_res / 2, x_res, 0.0, float(max(y[0], y[-1])) + y_res / 2, 0.0, -y_res)
+
+
+def read_netcdf_metadata(filepath: str) -> RasterMetadata:
+    '''
+    Header only, variable data other than 1-d coordinates is not read
+    '''
+    with netCDF4.Dataset(filepath) as dataset:
+        # Grid variables as GDAL sees them: 2 or more dims and not a coordinate
+        bands = tuple(name for name, variable in dataset.variables.items() if variable.ndim >= 2 and name not in dataset.dimensions)
+        if not bands:
+            return RasterMetadata('netCDF', (), (), None, '')
+
+        variable = dataset.variables[bands[0]]
+        grid_mapping = dataset.variables.get(getattr(variable, 'grid_mapping', ''))
+        projection = getattr(grid_mapping, 'spatial_ref', getattr(grid_mapping, 'crs_wkt', '')) if grid_mapping is not None else ''
+        return RasterMetadata('netCDF', bands, variable.shape, netcdf_geotransform(dataset, variable), projection)
+
+
+def read_gdal_metadata(filepath: str) -> RasterMetadata:
+    info = gdalinfo(filepath)
+    bands = tuple(
+        band.get('metadata', {}).get('', {}).get('NETCDF_VARNAME', f'Band{band["band"]}') for band in info.get('bands', []))
+    geotransform = tuple(info['geoTransform']) if 'geoTransform' in info else None
+    projection = info.get('coordinateSystem', {}).get('wkt', '')
+    return RasterMetadata(info.get('driverShortName', ''), bands, (info['size'][1], info['size'][0]), geotransform, projection)
+
+
+@functools.lru_cache(maxsize=1024)
+def _read_metadata(filepath: str, mtime_ns: int, size: int) -> RasterMetadata:
+    try:
+        return read_netcdf_metadata(filepath)
+    except OSError:
+        # Not netCDF (e.g. GRIB2), in-process GDAL or the gdalinfo binary
+        return read_gdal_metadata(filepath)
+
+
+def get_metadata(filepath: str) -> RasterMetadata:
+    '''
+    RasterMetadata of filepath, memoized by path, mtime and size so a rewritten file is read again
+    '''
+    stat = os.stat(filepath)
+    return _read_metadata(os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+
+
+def clear_metadata_cache() -> None:
+    _read_metadata.cache_clear()
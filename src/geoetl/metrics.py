@@ -0,0 +1,139 @@
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager
+from collections.abc import Callable
+
+
+def peak_rss() -> int:
+    '''
+    High-water resident set size in bytes of this process and of its finished subprocesses, over their whole
+    lifetime so far: it never goes down, and a stage run after a larger one reports the larger one's peak
+    '''
+    # ru_maxrss is in kilobytes on Linux
+    return 1024 * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def cpu_time() -> float:
+    '''
+    CPU seconds used by this process and its finished subprocesses
+    '''
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self_usage.ru_utime + self_usage.ru_stime + children_usage.ru_utime + children_usage.ru_stime
+
+
+class Metrics:
+    '''
+    Collects one record (a dict) per Transformer stage and per download.
+    Hooks are called with each record as it is added, e.g. to log or push it elsewhere.
+    Records are kept in the process that made them, so Index mode='process' workers keep their own.
+    CPU time is process-wide, so concurrent stages overlap in it. peak_rss_bytes is the process high-water mark
+    when the stage ended (see peak_rss), rss_growth_bytes how much the stage raised it
+    '''
+    def __init__(self, hooks: list=None):
+        self.hooks = list(hooks or [])
+        self.records = []
+        self.lock = threading.Lock()
+
+    def add_hook(self, hook: Callable) -> None:
+        self.hooks.append(hook)
+
+    def record(self, kind: str, **fields) -> dict:
+        record = {'kind': kind, **fields}
+        with self.lock:
+            self.records.append(record)
+        for hook in self.hooks:
+            hook(record)
+        return record
+
+    @contextmanager
+    def stage(self, name: str, input_bytes: int=0):
+        '''
+        Times the block; it can add fields such as output_bytes or exit_code to the yielded dict
+        '''
+        fields = {'name': name, 'input_bytes': input_bytes}
+        wall_start, cpu_start, rss_start = time.perf_counter(), cpu_time(), peak_rss()
+        try:
+            yield fields
+        except Exception as e:
+            fields['error'] = repr(e)
+            raise
+        finally:
+            rss_end = peak_rss()
+            fields.update(wall_seconds=time.perf_counter() - wall_start, cpu_seconds=cpu_time() - cpu_start,
+                          peak_rss_bytes=rss_end, rss_growth_bytes=rss_end - rss_start)
+            self.record('stage', **fields)
+
+    def summary(self) -> dict:
+        '''
+        Totals per stage name and over all downloads
+        '''
+        with self.lock:
+            records = list(self.records)
+
+        stages = {}
+        downloads = {'count': 0, 'bytes': 0, 'seconds': 0.0, 'errors': 0}
+        for record in records:
+            if record['kind'] == 'download':
+                downloads['count'] += 1
+                downloads['bytes'] += record.get('bytes', 0)
+                downloads['seconds'] += record.get('seconds', 0)
+                downloads['errors'] += 'error' in record
+                continue
+
+            stage = stages.setdefault(record['name'], {
+                'count': 0, 'errors': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                'input_bytes': 0, 'output_bytes': 0, 'peak_rss_bytes': 0, 'rss_growth_bytes': 0, 'failed_exit_codes': 0})
+            stage['count'] += 1
+            stage['errors'] += 'error' in record
+            stage['wall_seconds'] += record['wall_seconds']
+            stage['cpu_seconds'] += record['cpu_seconds']
+            stage['input_bytes'] += record.get('input_bytes', 0)
+            stage['output_bytes'] += record.get('output_bytes', 0)
+            stage['peak_rss_bytes'] = max(stage['peak_rss_bytes'], record['peak_rss_bytes'])
+            stage['rss_growth_bytes'] = max(stage['rss_growth_bytes'], record['rss_growth_bytes'])
+            stage['failed_exit_codes'] += any(record.get('exit_codes') or [])
+
+        downloads['throughput_bytes_per_second'] = downloads['bytes'] / downloads['seconds'] if downloads['seconds'] else 0.0
+        return {'stages': stages, 'downloads': downloads}
+
+    def to_json(self, records: bool=False) -> str:
+        report = self.summary()
+        if records:
+            report['records'] = self.records
+        return json.dumps(report)
+
+    def to_prometheus(self, prefix: str='geoetl') -> str:
+        summary = self.summary()
+        lines = []
+        for field, metric in (
+                ('count', 'stage_runs_total'), ('errors', 'stage_errors_total'),
+                ('wall_seconds', 'stage_wall_seconds_total'), ('cpu_seconds', 'stage_cpu_seconds_total'),
+                ('input_bytes', 'stage_input_bytes_total'), ('output_bytes', 'stage_output_bytes_total'),
+                ('failed_exit_codes', 'stage_failed_exit_codes_total'), ('peak_rss_bytes', 'stage_peak_rss_bytes'),
+                ('rss_growth_bytes', 'stage_rss_growth_bytes')):
+            lines.append(f'# TYPE {prefix}_{metric} {"gauge" if "rss" in metric else "counter"}')
+            for name, stage in summary['stages'].items():
+                lines.append(f'{prefix}_{metric}{{stage="{name}"}} {stage[field]}')
+
+        for field, metric, kind in (
+                ('count', 'downloads_total', 'counter'), ('errors', 'download_errors_total', 'counter'),
+                ('bytes', 'download_bytes_total', 'counter'), ('seconds', 'download_seconds_total', 'counter'),
+                ('throughput_bytes_per_second', 'download_throughput_bytes_per_second', 'gauge')):
+            lines.append(f'# TYPE {prefix}_{metric} {kind}')
+            lines.append(f'{prefix}_{metric} {summary["downloads"][field]}')
+        return '\n'.join(lines) + '\n'
+
+
+class NullMetrics(Metrics):
+    '''
+    Default when no Metrics are given, records nothing
+    '''
+    def record(self, kind: str, **fields) -> dict:
+        return fields
+
+    @contextmanager
+    def stage(self, name: str, input_bytes: int=0):
+        yield {}
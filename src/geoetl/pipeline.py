@@ -0,0 +1,105 @@
+from typing import List, Dict, Type, Union
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .api import FileNode, Transform, Transformer
+from .metrics import Metrics
+
+
+class Pipeline:
+    '''
+    DAG of steps over FileNodes, a branching Transformer.
+    A step with one parent is a Transform class; a step with several parents (fan-in) is a
+    callable taking the list of parent nodes, like the Index aggregators. parents=None is the root.
+    Each step runs once, on a thread pool, as soon as its parents are done, and its output is shared
+    by every child (fan-out). With remove_source, a node is truncated once its last child has finished.
+    run() returns the outputs of the sinks, the steps nothing depends on
+    '''
+    def __init__(self, remove_source: bool=True, debug: bool=False, max_workers: int=None, metrics: Metrics=None):
+        self.remove_source = remove_source
+        self.debug = debug
+        self.max_workers = max_workers
+        self.metrics = metrics
+        self.steps = {}
+
+    def add(self, name: str, step: Union[Type[Transform], Callable], parents: Union[str, List[str]]=None) -> 'Pipeline':
+        parents = [None] if parents is None else [parents] if isinstance(parents, str) else list(parents)
+        if name in self.steps or name is None:
+            raise ValueError(f'Invalid or duplicate step name {name}')
+        missing = [parent for parent in parents if parent is not None and parent not in self.steps]
+        if missing:
+            raise ValueError(f'Unknown parents {missing} for step {name}')
+        if isinstance(step, type) and issubclass(step, Transform) and len(parents) != 1:
+            raise ValueError(f'Transform step {name} takes exactly one parent')
+
+        self.steps[name] = (step, parents)
+        return self
+
+    def children(self) -> Dict[str, List[str]]:
+        children = {None: []}
+        children.update({name: [] for name in self.steps})
+        for name, (_, parents) in self.steps.items():
+            for parent in parents:
+                children[parent].append(name)
+        return children
+
+    def sinks(self) -> List[str]:
+        return [name for name, children in self.children().items() if name is not None and not children]
+
+    def run_step(self, applier: Transformer, name: str, nodes: List[FileNode]) -> FileNode:
+        step, _ = self.steps[name]
+        if isinstance(step, type) and issubclass(step, Transform):
+            return applier.apply(nodes[0], step)
+        print('Applying ' + name)
+        return step(nodes)
+
+    def run(self, root: FileNode) -> Dict[str, FileNode]:
+        children = self.children()
+        sinks = self.sinks()
+        waiting = {name: len(parents) for name, (_, parents) in self.steps.items()}
+        consumers = {name: len(names) for name, names in children.items()}
+        outputs = {None: root}
+        errors = []
+
+        # Steps never remove their own source, consumers are counted here instead
+        applier = Transformer(transforms=[], remove_source=False, debug=self.debug, metrics=self.metrics)
+
+        def release(name: str) -> None:
+            consumers[name] -= 1
+            if consumers[name] == 0 and self.remove_source and name not in sinks:
+                outputs.pop(name).truncate()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+
+            def submit(name: str) -> None:
+                nodes = [outputs[parent] for parent in self.steps[name][1]]
+                futures[executor.submit(self.run_step, applier, name, nodes)] = name
+
+            for name in children[None]:
+                waiting[name] -= 1
+                if not waiting[name]:
+                    submit(name)
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    try:
+                        outputs[name] = future.result()
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+
+                    for parent in self.steps[name][1]:
+                        release(parent)
+                    for child in children[name]:
+                        waiting[child] -= 1
+                        if not waiting[child] and not errors:
+                            submit(child)
+
+        if errors:
+            for name, node in outputs.items():
+                if name is not None:
+                    node.truncate()
+            raise errors[0]
+        return {name: outputs[name] for name in sinks}
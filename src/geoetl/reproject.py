@@ -0,0 +1,181 @@
+import os
+import hashlib
+import numpy as np
+from typing import Tuple
+from collections.abc import Callable
+from .api import FileNode
+from .geoapi import GDALWarpInProcess, open_gdal_dataset, gdal
+
+try:
+    from osgeo import osr
+except ImportError:
+    osr = None
+
+
+def pixel_centers(geotransform, shape) -> Tuple[np.ndarray, np.ndarray]:
+    rows, cols = np.indices(shape, dtype=np.float64)
+    rows += 0.5
+    cols += 0.5
+    x = geotransform[0] + cols * geotransform[1] + rows * geotransform[2]
+    y = geotransform[3] + cols * geotransform[4] + rows * geotransform[5]
+    return x, y
+
+
+class ReprojectionIndex:
+    '''
+    Source (row, col) of every target pixel, i.e. a nearest-neighbour warp precomputed once per grid.
+    Warping any array on the source grid is then a NumPy gather
+    '''
+    def __init__(self, rows: np.ndarray, cols: np.ndarray, target_geotransform, target_projection: str=''):
+        self.rows = rows
+        self.cols = cols
+        self.valid = rows >= 0
+        self.target_geotransform = tuple(target_geotransform)
+        self.target_projection = target_projection
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.rows.shape
+
+    @classmethod
+    def compute(cls, source_geotransform, source_shape, target_geotransform, target_shape, to_source: Callable, target_projection: str='') -> 'ReprojectionIndex':
+        '''
+        to_source maps target x, y arrays to source x, y arrays
+        '''
+        x, y = pixel_centers(target_geotransform, target_shape)
+        source_x, source_y = to_source(x.ravel(), y.ravel())
+
+        # Invert the source geotransform
+        x0, dx_col, dx_row, y0, dy_col, dy_row = source_geotransform
+        inverse = np.linalg.inv(np.array([[dx_col, dx_row], [dy_col, dy_row]]))
+        offsets = np.stack([np.asarray(source_x) - x0, np.asarray(source_y) - y0])
+        cols, rows = np.floor(inverse @ offsets).astype(np.int64)
+
+        outside = (rows < 0) | (rows >= source_shape[0]) | (cols < 0) | (cols >= source_shape[1])
+        rows[outside] = -1
+        cols[outside] = -1
+        return cls(rows.reshape(target_shape).astype(np.int32), cols.reshape(target_shape).astype(np.int32), target_geotransform, target_projection)
+
+    def warp(self, values: np.ndarray, fill=0) -> np.ndarray:
+        '''
+        values is one grid or a stack of grids with the grid in the last two axes
+        '''
+        warped = values[..., np.where(self.valid, self.rows, 0), np.where(self.valid, self.cols, 0)]
+        warped[..., ~self.valid] = fill
+        return warped
+
+    def save(self, filepath: str) -> None:
+        tmp_filepath = filepath + '.tmp.npz'
+        np.savez(tmp_filepath, rows=self.rows, cols=self.cols,
+                 target_geotransform=np.array(self.target_geotransform), target_projection=np.array(self.target_projection))
+        os.replace(tmp_filepath, filepath)
+
+    @classmethod
+    def load(cls, filepath: str) -> 'ReprojectionIndex':
+        with np.load(filepath) as index:
+            return cls(index['rows'], index['cols'], index['target_geotransform'], str(index['target_projection']))
+
+
+class ReprojectionCache:
+    '''
+    ReprojectionIndex objects on disk (and in memory) keyed by grid signature
+    '''
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.indexes = {}
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def signature(*parts) -> str:
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def get(self, signature: str, compute: Callable) -> ReprojectionIndex:
+        if signature in self.indexes:
+            return self.indexes[signature]
+
+        filepath = os.path.join(self.directory, signature + '.npz')
+        if os.path.exists(filepath):
+            index = ReprojectionIndex.load(filepath)
+        else:
+            index = compute()
+            index.save(filepath)
+        self.indexes[signature] = index
+        return index
+
+
+class GDALWarpIndexed(GDALWarpInProcess):
+    '''
+    Nearest-neighbour warp of GDALWarpBase.command through a cached ReprojectionIndex.
+    The index is computed with GDAL/OSR the first time a source grid is seen
+    and stored under reprojection_directory (default ETL_DIR/reprojection)
+    '''
+    in_memory_source = True
+    reprojection_directory = ''
+    _caches = {}
+
+    @classmethod
+    def cache(cls) -> ReprojectionCache:
+        directory = cls.reprojection_directory or os.path.join(os.environ.get('ETL_DIR', './'), 'reprojection')
+        if directory not in cls._caches:
+            cls._caches[directory] = ReprojectionCache(directory)
+        return cls._caches[directory]
+
+    @classmethod
+    def reprojection_index(cls, source_ds) -> ReprojectionIndex:
+        source_projection = source_ds.GetProjection()
+        source_geotransform = source_ds.GetGeoTransform()
+        source_shape = (source_ds.RasterYSize, source_ds.RasterXSize)
+
+        def compute() -> ReprojectionIndex:
+            (x_min, y_min, x_max, y_max), width, height, target_projection = cls.target_grid(source_ds)
+            target_geotransform = (x_min, (x_max - x_min) / width, 0, y_max, 0, (y_min - y_max) / height)
+            target_shape = (height, width)
+
+            source_srs = osr.SpatialReference(wkt=source_projection)
+            target_srs = osr.SpatialReference(wkt=target_projection)
+            for srs in (source_srs, target_srs):
+                srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            transformation = osr.CoordinateTransformation(target_srs, source_srs)
+
+            def to_source(x, y):
+                points = np.array(transformation.TransformPoints(np.stack([x, y], axis=1)))
+                return points[:, 0], points[:, 1]
+
+            return ReprojectionIndex.compute(source_geotransform, source_shape, target_geotransform, target_shape, to_source, target_projection)
+
+        signature = ReprojectionCache.signature(cls.command, source_projection, source_geotransform, source_shape)
+        return cls.cache().get(signature, compute)
+
+    def transform(self) -> FileNode:
+        with open_gdal_dataset(self.source_node) as source_ds:
+            index = self.reprojection_index(source_ds)
+            band = source_ds.GetRasterBand(1)
+            nodata = band.GetNoDataValue()
+            warped = index.warp(band.ReadAsArray(), fill=0 if nodata is None else nodata)
+
+        memory_ds = gdal.GetDriverByName('MEM').Create('', index.shape[1], index.shape[0], 1, gdal.GDT_Float64)
+        memory_ds.SetGeoTransform(index.target_geotransform)
+        memory_ds.SetProjection(index.target_projection)
+        memory_band = memory_ds.GetRasterBand(1)
+        memory_band.WriteArray(warped)
+        if nodata is not None:
+            memory_band.SetNoDataValue(nodata)
+
+        destination_filepath = self.get_temp_file()
+        destination_ds = gdal.Translate(destination_filepath, memory_ds, options=gdal.TranslateOptions(options=self.translate_options()))
+        if destination_ds is None:
+            raise Exception(f'{type(self).__name__} failed')
+        destination_ds = None
+        return FileNode(filepath=destination_filepath)
+
+    @classmethod
+    def translate_options(cls) -> list:
+        '''
+        The -ot and -of arguments of the gdalwarp command, which gdal_translate shares
+        '''
+        options = cls.command_options()
+        translate = []
+        for flag in ('-ot', '-of'):
+            if flag in options:
+                translate += [flag, options[options.index(flag) + 1]]
+        return translate
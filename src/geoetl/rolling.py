@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import shutil
+import numpy as np
+from .api import FileNode
+from .geoapi import read_band, write_band
+
+
+class RollingAggregator:
+    '''
+    Persistent "last window seconds" sum, max and count of "band", kept in a state directory:
+    memory-mapped sum.npy/max.npy/count.npy running grids, one compressed slices/<n>.npz per time slice
+    at the band's precision, template.nc for the output file and state.json with the slice keys and timestamps.
+    Adding a slice folds it in, slices older than window (relative to the newest slice)
+    are subtracted back out, so a tick costs the new files rather than the whole window.
+    Usable as an Index aggregator, slices are keyed by the node's listing key and timestamp
+    '''
+    stats = ('sum', 'max', 'count')
+
+    def __init__(self, directory: str, window: float, band: str='Band1', stat: str='sum'):
+        if stat not in self.stats:
+            raise ValueError(f'Unknown stat {stat}, expected one of {self.stats}')
+
+        self.directory = directory
+        self.window = window
+        self.band = band
+        self.stat = stat
+        self.grids = {}
+        self.slices = {}
+        self.next_slice = 0
+
+        os.makedirs(os.path.join(directory, 'slices'), exist_ok=True)
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+            self.slices = state['slices']
+            self.next_slice = state['next_slice']
+            self.grids = {stat: np.load(self.grid_path(stat), mmap_mode='r+') for stat in self.stats}
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.directory, 'state.json')
+
+    @property
+    def template_path(self) -> str:
+        return os.path.join(self.directory, 'template.nc')
+
+    def grid_path(self, stat: str) -> str:
+        return os.path.join(self.directory, f'{stat}.npy')
+
+    def slice_path(self, number: int) -> str:
+        return os.path.join(self.directory, 'slices', f'{number}.npz')
+
+    def load_slice(self, number: int) -> np.ndarray:
+        with np.load(self.slice_path(number)) as archive:
+            return archive['values'].astype(np.float64)
+
+    def create_grids(self, shape) -> None:
+        self.grids = {
+            'sum': np.lib.format.open_memmap(self.grid_path('sum'), mode='w+', dtype=np.float64, shape=shape),
+            'max': np.lib.format.open_memmap(self.grid_path('max'), mode='w+', dtype=np.float64, shape=shape),
+            'count': np.lib.format.open_memmap(self.grid_path('count'), mode='w+', dtype=np.int32, shape=shape)}
+        self.grids['max'][:] = np.nan
+
+    def newest(self) -> float:
+        return max((timestamp for _, timestamp in self.slices.values()), default=None)
+
+    def add(self, node: FileNode, key: str=None, timestamp: float=None) -> bool:
+        '''
+        Returns False if the slice was already added or is outside the window
+        '''
+        key = key or node.metadata.get('key') or node.filepath
+        if timestamp is None:
+            timestamp = node.metadata.get('timestamp')
+        if timestamp is None:
+            timestamp = time.time()
+        newest = self.newest()
+        if key in self.slices or (newest is not None and timestamp <= newest - self.window):
+            return False
+
+        band = read_band(node.filepath, self.band)
+        # Stored as read (float32 if not floating), the running grids add the same values widened to float64
+        stored = band if np.issubdtype(band.dtype, np.floating) else band.astype(np.float32)
+        values = stored.astype(np.float64)
+        if not self.grids:
+            self.create_grids(values.shape)
+
+        valid = ~np.isnan(values)
+        self.grids['sum'] += np.where(valid, values, 0)
+        self.grids['count'] += valid
+        np.fmax(self.grids['max'], values, out=self.grids['max'])
+
+        np.savez_compressed(self.slice_path(self.next_slice), values=stored)
+        self.slices[key] = (self.next_slice, timestamp)
+        self.next_slice += 1
+
+        if newest is None or timestamp >= newest:
+            shutil.copyfile(node.filepath, self.template_path)
+        self.expire()
+        self.save()
+        return True
+
+    def expire(self) -> None:
+        cutoff = self.newest() - self.window
+        expired = [key for key, (_, timestamp) in self.slices.items() if timestamp <= cutoff]
+        recompute_max = False
+        for key in expired:
+            number, _ = self.slices.pop(key)
+            values = self.load_slice(number)
+            valid = ~np.isnan(values)
+            self.grids['sum'] -= np.where(valid, values, 0)
+            self.grids['count'] -= valid
+            # Max is not invertible, only rebuilt if the expired slice reached it somewhere
+            recompute_max = recompute_max or bool(np.any(valid & (values >= self.grids['max'])))
+            os.remove(self.slice_path(number))
+
+        if recompute_max:
+            self.grids['max'][:] = np.nan
+            for number, _ in self.slices.values():
+                np.fmax(self.grids['max'], self.load_slice(number), out=self.grids['max'])
+
+    def rebuild(self) -> None:
+        '''
+        Recompute every running grid from the stored slices, e.g. to clear float drift in sum
+        '''
+        self.grids['sum'][:] = 0
+        self.grids['count'][:] = 0
+        self.grids['max'][:] = np.nan
+        for number, _ in self.slices.values():
+            values = self.load_slice(number)
+            valid = ~np.isnan(values)
+            self.grids['sum'] += np.where(valid, values, 0)
+            self.grids['count'] += valid
+            np.fmax(self.grids['max'], values, out=self.grids['max'])
+        self.save()
+
+    def save(self) -> None:
+        for grid in self.grids.values():
+            grid.flush()
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'slices': self.slices, 'next_slice': self.next_slice}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def result(self, stat: str=None) -> FileNode:
+        stat = stat or self.stat
+        if not self.slices:
+            raise ValueError('No slices in the window')
+        return write_band(self.template_path, self.band, np.nan_to_num(self.grids[stat]))
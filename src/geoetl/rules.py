@@ -0,0 +1,177 @@
+import re
+import calendar
+import datetime
+import threading
+import numpy as np
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Iterable, Tuple
+from .api import Validator, Listing
+from .geoapi import ListingStore, size_cap, date_window
+
+
+class Rule:
+    '''
+    One named condition of a RuleValidator. mask evaluates it over a whole ListingStore at once,
+    is_valid over one listing and is_header_valid over one response's headers.
+    A rule that can't judge from what it is given passes (mask returns None)
+    '''
+    def __init__(self, name: str=None):
+        self.name = name or type(self).__name__
+
+    def mask(self, store: ListingStore) -> np.ndarray:
+        return None
+
+    def is_valid(self, listing: Listing) -> bool:
+        return True
+
+    def is_header_valid(self, headers) -> bool:
+        return True
+
+
+class SizeCap(Rule):
+    '''
+    At most max_size bytes. Unknown sizes (no size listed, no Content-Length) are rejected unless allow_unknown
+    '''
+    def __init__(self, max_size: int, allow_unknown: bool=False, name: str=None):
+        super(SizeCap, self).__init__(name)
+        self.max_size = max_size
+        self.allow_unknown = allow_unknown
+
+    def mask(self, store: ListingStore) -> np.ndarray:
+        mask = size_cap(self.max_size)(store)
+        return mask | (store.sizes < 0) if self.allow_unknown else mask
+
+    def check(self, size) -> bool:
+        return self.allow_unknown if size is None else int(size) <= self.max_size
+
+    def is_valid(self, listing: Listing) -> bool:
+        return self.check(getattr(listing, 'size', None))
+
+    def is_header_valid(self, headers) -> bool:
+        return self.check(headers.get('Content-Length'))
+
+
+class DateWindow(Rule):
+    '''
+    Modified in [start, end), epoch seconds; either end may be open. Unknown times are rejected
+    '''
+    def __init__(self, start: float=None, end: float=None, name: str=None):
+        super(DateWindow, self).__init__(name)
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def day(cls, date: datetime.date=None, name: str=None) -> 'DateWindow':
+        '''
+        The UTC day of date, today by default. The window is fixed here, not recomputed per listing
+        '''
+        date = date or datetime.datetime.now(datetime.timezone.utc).date()
+        start = calendar.timegm(date.timetuple())
+        return cls(start, start + 86400, name=name)
+
+    def mask(self, store: ListingStore) -> np.ndarray:
+        return date_window(self.start, self.end)(store)
+
+    def check(self, epoch: float) -> bool:
+        if epoch is None:
+            return False
+        return (self.start is None or epoch >= self.start) and (self.end is None or epoch < self.end)
+
+    def is_valid(self, listing: Listing) -> bool:
+        return self.check(listing.timestamp())
+
+    def is_header_valid(self, headers) -> bool:
+        try:
+            return self.check(parsedate_to_datetime(headers['Last-Modified']).timestamp())
+        except (KeyError, TypeError, ValueError):
+            return False
+
+
+class ContentType(Rule):
+    '''
+    Content-Type (parameters ignored) is one of content_types. Listings carry no type, so this only judges headers
+    '''
+    def __init__(self, *content_types: str, name: str=None):
+        super(ContentType, self).__init__(name)
+        self.content_types = set(content_types)
+
+    def is_header_valid(self, headers) -> bool:
+        return headers.get('Content-Type', '').split(';')[0].strip() in self.content_types
+
+
+class NamePattern(Rule):
+    '''
+    Filename matches pattern (re.search). Headers carry no name, so this only judges listings
+    '''
+    def __init__(self, pattern: str, name: str=None):
+        super(NamePattern, self).__init__(name)
+        self.pattern = re.compile(pattern)
+
+    def mask(self, store: ListingStore) -> np.ndarray:
+        # map keeps the loop over names in C
+        return np.fromiter(map(bool, map(self.pattern.search, store.names)), dtype=bool, count=len(store))
+
+    def is_valid(self, listing: Listing) -> bool:
+        name = getattr(listing, 'name', None) or listing.url.rsplit('/', 1)[-1]
+        return self.pattern.search(name) is not None
+
+
+class RuleValidator(Validator):
+    '''
+    Validator made of rules that must all pass. mask evaluates every rule over a whole ListingStore at once,
+    select keeps the rows it passes and checks them one by one only against rules without a mask,
+    is_valid and is_header_valid apply them one listing or response at a time where there is no store.
+    rejected counts, per rule name, the rows and responses that rule rejected (a row failing two rules counts for both)
+    '''
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.rejected = {rule.name: 0 for rule in self.rules}
+
+    def count(self, rejected: Dict[str, int]) -> None:
+        # Responses may be checked from download threads
+        with self.lock:
+            for name, count in rejected.items():
+                self.rejected[name] += count
+
+    def masks(self, store: ListingStore) -> Tuple[np.ndarray, List[Rule]]:
+        '''
+        (row mask of the rules that have one, rules without a mask)
+        '''
+        mask = np.ones(len(store), dtype=bool)
+        rejected = {}
+        unmasked = []
+        for rule in self.rules:
+            rule_mask = rule.mask(store)
+            if rule_mask is None:
+                unmasked.append(rule)
+                continue
+            rejected[rule.name] = len(store) - int(np.count_nonzero(rule_mask))
+            mask &= rule_mask
+        self.count(rejected)
+        return mask, unmasked
+
+    def mask(self, store: ListingStore) -> np.ndarray:
+        return self.masks(store)[0]
+
+    def select(self, store: ListingStore) -> Iterable[Listing]:
+        # Rows the mask kept are only checked against the rules it couldn't evaluate
+        mask, unmasked = self.masks(store)
+        listings = store.listings(mask)
+        return filter(lambda listing: self.check(listing, unmasked), listings) if unmasked else listings
+
+    def check(self, listing: Listing, rules: List[Rule]) -> bool:
+        failed = [rule.name for rule in rules if not rule.is_valid(listing)]
+        self.count({name: 1 for name in failed})
+        return not failed
+
+    def is_valid(self, listing: Listing) -> bool:
+        return self.check(listing, self.rules)
+
+    def is_header_valid(self, headers) -> bool:
+        failed = [rule.name for rule in self.rules if not rule.is_header_valid(headers)]
+        self.count({name: 1 for name in failed})
+        return not failed
@@ -0,0 +1,110 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+
+# Active workspaces, innermost last. Module level rather than thread local so Index threads and
+# forked workers write into the workspace of the run that started them
+_active = []
+
+
+def current_workspace() -> 'Workspace':
+    return _active[-1] if _active else None
+
+
+class Workspace:
+    '''
+    Scratch space of one run. While active (with Workspace(...) as workspace), utils.get_temp_file hands out
+    paths inside it: under tmpfs_directory (a RAM disk, e.g. /dev/shm or $ETL_TMPFS) for intermediates expected
+    to be at most tmpfs_max_bytes while that tier stays under tmpfs_quota, otherwise under directory ($ETL_DIR).
+    quota caps the bytes on both tiers: parallel Index modes wait for in-flight work to free space before
+    starting another listing, and give up after wait_timeout seconds.
+    Everything left is removed on exit, also when the run fails; move results out first with persist
+    '''
+    def __init__(self, directory: str=None, quota: int=None, tmpfs_directory: str=None, tmpfs_max_bytes: int=2**26,
+                 tmpfs_quota: int=2**30, wait_timeout: float=300.0, poll: float=0.1):
+        self.directory = directory or os.environ.get('ETL_DIR', './')
+        self.quota = quota
+        self.tmpfs_directory = tmpfs_directory or os.environ.get('ETL_TMPFS')
+        self.tmpfs_max_bytes = tmpfs_max_bytes
+        self.tmpfs_quota = tmpfs_quota
+        self.wait_timeout = wait_timeout
+        self.poll = poll
+        self.root = None
+        self.tmpfs_root = None
+
+    def __enter__(self) -> 'Workspace':
+        self.root = tempfile.mkdtemp(prefix='workspace_', dir=self.directory)
+        if self.tmpfs_directory:
+            try:
+                self.tmpfs_root = tempfile.mkdtemp(prefix='workspace_', dir=self.tmpfs_directory)
+            except OSError as e:
+                print(f'No tmpfs tier, {self.tmpfs_directory} is not usable: {e!r}')
+        _active.append(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _active.remove(self)
+        self.cleanup()
+
+    def path(self, prefix: str='', size_hint: int=None) -> str:
+        name = f'{prefix}_{uuid.uuid4().hex}'
+        if self.tmpfs_root is not None and size_hint is not None and size_hint <= self.tmpfs_max_bytes:
+            if self.directory_usage(self.tmpfs_root) + size_hint <= self.tmpfs_quota:
+                return os.path.join(self.tmpfs_root, name)
+        return os.path.join(self.root, name)
+
+    @staticmethod
+    def directory_usage(directory: str) -> int:
+        usage = 0
+        for entry in os.scandir(directory):
+            try:
+                if entry.is_file():
+                    usage += entry.stat().st_size
+            except FileNotFoundError:
+                # Removed while scanning
+                pass
+        return usage
+
+    def usage(self) -> int:
+        return sum(self.directory_usage(root) for root in (self.root, self.tmpfs_root) if root is not None)
+
+    def has_space(self) -> bool:
+        return self.quota is None or self.usage() < self.quota
+
+    def wait_for_space(self) -> None:
+        deadline = time.time() + self.wait_timeout
+        while not self.has_space():
+            if time.time() > deadline:
+                raise Exception(f'Workspace {self.root} stayed over its quota of {self.quota} bytes for {self.wait_timeout}s')
+            time.sleep(self.poll)
+
+    def persist(self, node, directory: str=None):
+        '''
+        Moves a node out of the workspace (to directory, by default the workspace's parent) so it survives cleanup
+        '''
+        if node.in_memory:
+            return node
+        destination_filepath = os.path.join(directory or self.directory, os.path.basename(node.filepath))
+        shutil.move(node.filepath, destination_filepath)
+        return type(node)(filepath=destination_filepath, metadata=node.metadata)
+
+    def cleanup(self) -> None:
+        for root in (self.root, self.tmpfs_root):
+            if root is not None:
+                shutil.rmtree(root, ignore_errors=True)
+        self.root, self.tmpfs_root = None, None
+
+    @staticmethod
+    def remove_stale(directory: str=None, max_age: float=86400.0) -> int:
+        '''
+        Removes workspaces left by runs that were killed before cleaning up, returns how many
+        '''
+        directory = directory or os.environ.get('ETL_DIR', './')
+        removed = 0
+        for entry in os.scandir(directory):
+            if entry.name.startswith('workspace_') and entry.is_dir() and time.time() - entry.stat().st_mtime > max_age:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        return removed
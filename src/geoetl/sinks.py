@@ -0,0 +1,190 @@
+import os
+import s3fs
+import numpy as np
+import xarray as xr
+from io import BytesIO
+from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from fsspec.asyn import sync
+from fsspec.core import url_to_fs
+from .api import FileNode
+from .utils import get_temp_file, bounded_map
+from .geoapi import NetcdfTransform, open_gdal_dataset, gdal
+
+try:
+    import zarr
+except ImportError:
+    zarr = None
+
+
+class S3Sink:
+    '''
+    Streaming S3 transfers through s3fs call_s3.
+    Objects larger than part_size go up as multipart uploads and come down as ranged GETs,
+    max_workers parts at a time, so memory stays at about max_workers * part_size.
+    S3 needs parts of at least 5 MiB, except the last one
+    '''
+    def __init__(self, bucket: str, s3: s3fs.S3FileSystem=None, part_size: int=8 * 2**20, max_workers: int=8, **storage_options):
+        self.bucket = bucket.strip('/')
+        self.s3 = s3 or s3fs.S3FileSystem(**storage_options)
+        self.part_size = part_size
+        self.max_workers = max_workers
+
+    def parts(self, size: int):
+        return [(number, offset, min(self.part_size, size - offset)) for number, offset in enumerate(range(0, size, self.part_size), 1)]
+
+    def put(self, source_filepath: str, key: str) -> None:
+        size = os.path.getsize(source_filepath)
+        if size <= self.part_size:
+            with open(source_filepath, 'rb') as f:
+                self.s3.call_s3('put_object', Bucket=self.bucket, Key=key, Body=f.read())
+            return
+
+        fd = os.open(source_filepath, os.O_RDONLY)
+        try:
+            self.multipart_upload(key, size, lambda offset, length: os.pread(fd, length, offset))
+        finally:
+            os.close(fd)
+
+    def put_obj(self, source_content: BytesIO, key: str) -> None:
+        self.put_buffer(source_content.getbuffer(), key)
+
+    def put_buffer(self, buffer: memoryview, key: str) -> None:
+        # botocore wants bytes, so only the parts in flight are copied out of the buffer
+        try:
+            if buffer.nbytes <= self.part_size:
+                self.s3.call_s3('put_object', Bucket=self.bucket, Key=key, Body=bytes(buffer))
+                return
+            self.multipart_upload(key, buffer.nbytes, lambda offset, length: bytes(buffer[offset:offset + length]))
+        finally:
+            buffer.release()
+
+    def multipart_upload(self, key: str, size: int, read_part) -> None:
+        upload_id = self.s3.call_s3('create_multipart_upload', Bucket=self.bucket, Key=key)['UploadId']
+
+        def upload_part(part) -> dict:
+            number, offset, length = part
+            response = self.s3.call_s3(
+                'upload_part', Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=read_part(offset, length))
+            return {'PartNumber': number, 'ETag': response['ETag']}
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                uploaded = list(bounded_map(executor, upload_part, self.parts(size), self.max_workers))
+            self.s3.call_s3(
+                'complete_multipart_upload', Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': uploaded})
+        except Exception:
+            self.s3.call_s3('abort_multipart_upload', Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    def size(self, key: str) -> int:
+        return self.s3.call_s3('head_object', Bucket=self.bucket, Key=key)['ContentLength']
+
+    def get_range(self, key: str, offset: int, length: int) -> bytes:
+        response = self.s3.call_s3('get_object', Bucket=self.bucket, Key=key, Range=f'bytes={offset}-{offset + length - 1}')
+        body = response['Body']
+
+        async def read() -> bytes:
+            async with body:
+                return await body.read()
+        return sync(self.s3.loop, read)
+
+    def get(self, key: str, destination_filepath: str) -> None:
+        size = self.size(key)
+        fd = os.open(destination_filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+
+            def download_part(part) -> None:
+                number, offset, length = part
+                os.pwrite(fd, self.get_range(key, offset, length), offset)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for _ in bounded_map(executor, download_part, self.parts(size), self.max_workers):
+                    pass
+        finally:
+            os.close(fd)
+
+    def get_obj(self, key: str) -> BytesIO:
+        size = self.size(key)
+        content = BytesIO()
+        if size:
+            # Extend to the object size so parts can be written in place
+            content.seek(size - 1)
+            content.write(b'\0')
+            content.seek(0)
+        buffer = content.getbuffer()
+        try:
+            def download_part(part) -> None:
+                number, offset, length = part
+                buffer[offset:offset + length] = self.get_range(key, offset, length)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for _ in bounded_map(executor, download_part, self.parts(size), self.max_workers):
+                    pass
+        finally:
+            buffer.release()
+        return content
+
+    def put_node(self, node: FileNode, key: str) -> None:
+        if node.in_memory:
+            self.put_buffer(node.buffer(), key)
+        else:
+            self.put(node.filepath, key)
+
+
+class ZarrSink:
+    '''
+    Appends netCDF grids along a time dimension "t" of a chunked Zarr store (local path or s3:// url),
+    readers then fetch only the chunks of the window they ask for
+    '''
+    def __init__(self, store: str, band: str='Band1', chunks: Tuple[int, int]=(256, 256), storage_options: dict=None):
+        if zarr is None:
+            raise Exception('zarr not found, please install geoetl[zarr]')
+        self.store = store
+        self.band = band
+        self.chunks = chunks
+        self.storage_options = storage_options
+
+    def exists(self) -> bool:
+        fs, path = url_to_fs(self.store, **(self.storage_options or {}))
+        return fs.exists(path)
+
+    def append(self, node: FileNode, timestamp: float) -> None:
+        with NetcdfTransform.get_xr_dataset(node.filepath) as source_xr:
+            band_ref = NetcdfTransform.get_band_ref(source_xr, self.band)
+            rows, cols = band_ref.dims[-2:]
+            dataset = band_ref.to_dataset().expand_dims(t=[np.datetime64(int(timestamp), 's')])
+            dataset = dataset.chunk({'t': 1, rows: self.chunks[0], cols: self.chunks[1]})
+            for variable in dataset.variables.values():
+                variable.encoding = {}
+
+            if self.exists():
+                dataset.to_zarr(self.store, mode='a', append_dim='t', consolidated=False, storage_options=self.storage_options)
+            else:
+                dataset['t'].encoding = {'units': 'seconds since 1970-01-01', 'dtype': 'int64'}
+                dataset.to_zarr(self.store, mode='w', consolidated=False, storage_options=self.storage_options)
+
+    def read_window(self, rows: slice=slice(None), cols: slice=slice(None), t: slice=slice(None)) -> xr.DataArray:
+        '''
+        Loads band[t, rows, cols] by position
+        '''
+        with xr.open_zarr(self.store, consolidated=False, storage_options=self.storage_options) as dataset:
+            band_ref = NetcdfTransform.get_band_ref(dataset, self.band)
+            return band_ref.isel({'t': t, band_ref.dims[-2]: rows, band_ref.dims[-1]: cols}).load()
+
+
+def write_cog(node: FileNode, destination_filepath: str='', compress: str='DEFLATE') -> FileNode:
+    '''
+    Cloud-optimized GeoTIFF of a raster node (tiled, with overviews), readable by window over HTTP range requests
+    '''
+    if gdal is None:
+        raise Exception('GDAL Python bindings (osgeo) not found, COG output needs them')
+
+    destination_filepath = destination_filepath or get_temp_file(prefix='cog')
+    with open_gdal_dataset(node) as source_ds:
+        destination_ds = gdal.Translate(destination_filepath, source_ds, format='COG', creationOptions=[f'COMPRESS={compress}'])
+        if destination_ds is None:
+            raise Exception('COG translation failed')
+        destination_ds = None
+    return FileNode(filepath=destination_filepath)
@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from collections.abc import Callable
+from geoetl.api import Transformer, GunzipTransform
+from geoetl.geoapi import ApacheIndex, LoadNetcdf, GDALWarpFactory, SumAccumulator, xr_mf_sum, tree_reduce
+from .server import StandInServer
+from .fixtures import mrms_files, netcdf_nodes
+from .test_index import AcceptAll
+
+
+def measure(func: Callable, repeat: int) -> dict:
+    '''
+    Best wall time over repeat runs, and the tracemalloc peak (Python and NumPy allocations) of the first
+    '''
+    seconds = []
+    peak_bytes = 0
+    for i in range(repeat):
+        if i == 0:
+            tracemalloc.start()
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+        if i == 0:
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return {'seconds': min(seconds), 'peak_bytes': peak_bytes}
+
+
+def truncate_all(nodes) -> None:
+    for node in nodes:
+        if node is not None:
+            node.truncate()
+
+
+def chain_benchmark(server: StandInServer, path: str, transforms: list) -> Callable:
+    def run():
+        index = ApacheIndex(server.url + path, AcceptAll(), Transformer(transforms, remove_source=True))
+        index.fetch_listings()
+        truncate_all(index.transform_index())
+        if index.failures:
+            raise index.failures[0][1]
+    return run
+
+
+def benchmarks(args, server: StandInServer) -> dict:
+    '''
+    {name: callable}; a fixture or benchmark that raises is reported as skipped
+    '''
+    shape = tuple(args.grid)
+    server.add_directory('/netcdf/', mrms_files(args.count, shape, kind='netcdf'))
+
+    suite = {
+        'fetch_listings': lambda: ApacheIndex(server.url + '/netcdf/', AcceptAll(), Transformer([])).fetch_listings(),
+        'chain_gunzip': chain_benchmark(server, '/netcdf/', [GunzipTransform]),
+        'chain_gunzip_load': chain_benchmark(server, '/netcdf/', [GunzipTransform, LoadNetcdf]),
+    }
+
+    try:
+        server.add_directory('/grib2/', mrms_files(args.count, shape, kind='grib2'))
+        warp = GDALWarpFactory.make('GDALWarpUngrib')
+        suite['chain_gunzip_warp_load'] = chain_benchmark(server, '/grib2/', [GunzipTransform, warp, LoadNetcdf])
+    except Exception as e:
+        suite['chain_gunzip_warp_load'] = e
+
+    def aggregate(reduce: Callable) -> Callable:
+        def run():
+            nodes = netcdf_nodes(args.count, shape)
+            try:
+                reduce(nodes).truncate()
+            finally:
+                truncate_all(nodes)
+        return run
+
+    def accumulate(nodes):
+        accumulator = SumAccumulator()
+        for node in nodes:
+            accumulator.add(node)
+        return accumulator.result()
+
+    suite['xr_mf_sum'] = aggregate(xr_mf_sum)
+    suite['sum_accumulator'] = aggregate(accumulate)
+    suite['tree_reduce'] = aggregate(tree_reduce)
+    return suite
+
+
+def run(args) -> dict:
+    results = {}
+    with StandInServer() as server:
+        suite = benchmarks(args, server)
+        for name, func in suite.items():
+            try:
+                if isinstance(func, Exception):
+                    raise func
+                results[name] = measure(func, args.repeat)
+            except Exception as e:
+                results[name] = {'skipped': repr(e)}
+            print(f'{name}: {results[name]}')
+    return {'grid': list(args.grid), 'count': args.count, 'results': results}
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    '''
+    Benchmarks slower or more memory hungry than the baseline by more than tolerance (a fraction)
+    '''
+    if (baseline['grid'], baseline['count']) != (report['grid'], report['count']):
+        raise ValueError(f'Baseline was measured on grid {baseline["grid"]} x {baseline["count"]} files')
+
+    found = []
+    for name, result in report['results'].items():
+        previous = baseline['results'].get(name, {})
+        for field in ('seconds', 'peak_bytes'):
+            if field in result and field in previous and result[field] > previous[field] * (1 + tolerance):
+                found.append(f'{name} {field}: {previous[field]} -> {result[field]}')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks of the ETL chain on synthetic MRMS fixtures')
+    parser.add_argument('--grid', type=int, nargs=2, default=[700, 1400], metavar=('ROWS', 'COLS'))
+    parser.add_argument('--count', type=int, default=8, help='files per fixture directory')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--save', help='write the JSON report here')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    os.environ.setdefault('ETL_DIR', './')
+    report = run(args)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for regression in found:
+            print(f'Regression: {regression}')
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
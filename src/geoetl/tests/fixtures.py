@@ -0,0 +1,91 @@
+import os
+import gzip
+import time
+import numpy as np
+import xarray as xr
+from typing import Tuple
+from geoetl.utils import get_temp_file
+from geoetl.api import FileNode
+from geoetl.geoapi import gdal
+
+
+def synthetic_grid(shape: Tuple[int, int], seed: int=0) -> np.ndarray:
+    '''
+    MESH-like field: mostly missing (-3, as in MRMS), with a few positive storm cells
+    '''
+    rng = np.random.default_rng(seed)
+    values = np.full(shape, -3.0)
+    rows, cols = np.indices(shape)
+    for _ in range(max(1, shape[0] * shape[1] // 20000)):
+        row, col, radius = rng.integers(0, shape[0]), rng.integers(0, shape[1]), rng.integers(2, 20)
+        cell = (rows - row) ** 2 + (cols - col) ** 2 < radius ** 2
+        values[cell] = rng.uniform(1, 80)
+    return values
+
+
+def grid_coords(shape: Tuple[int, int]) -> dict:
+    # CONUS extent of the MRMS grid
+    return {'lat': np.linspace(54.995, 20.005, shape[0]), 'lon': np.linspace(-129.995, -60.005, shape[1])}
+
+
+def netcdf_bytes(values: np.ndarray) -> bytes:
+    filepath = get_temp_file(prefix='fixture')
+    xr.Dataset({'Band1': (('lat', 'lon'), values.astype(np.int16))}, coords=grid_coords(values.shape)).to_netcdf(filepath)
+    with open(filepath, 'rb') as f:
+        content = f.read()
+    os.remove(filepath)
+    return content
+
+
+def grib2_bytes(values: np.ndarray) -> bytes:
+    '''
+    Needs the GDAL Python bindings, the GRIB driver can only CreateCopy
+    '''
+    if gdal is None:
+        raise Exception('GDAL Python bindings (osgeo) not found, grib2 fixtures unavailable')
+
+    coords = grid_coords(values.shape)
+    memory_ds = gdal.GetDriverByName('MEM').Create('', values.shape[1], values.shape[0], 1, gdal.GDT_Float32)
+    resolution = (coords['lon'][-1] - coords['lon'][0]) / (values.shape[1] - 1)
+    memory_ds.SetGeoTransform((coords['lon'][0] - resolution / 2, resolution, 0, coords['lat'][0] + resolution / 2, 0, -resolution))
+    memory_ds.SetProjection('EPSG:4326')
+    memory_ds.GetRasterBand(1).WriteArray(values)
+
+    vsimem_path = '/vsimem/fixture.grib2'
+    gdal.GetDriverByName('GRIB').CreateCopy(vsimem_path, memory_ds)
+    handle = gdal.VSIFOpenL(vsimem_path, 'rb')
+    gdal.VSIFSeekL(handle, 0, 2)
+    size = gdal.VSIFTellL(handle)
+    gdal.VSIFSeekL(handle, 0, 0)
+    content = gdal.VSIFReadL(1, size, handle)
+    gdal.VSIFCloseL(handle)
+    gdal.Unlink(vsimem_path)
+    return content
+
+
+def mrms_files(count: int, shape: Tuple[int, int], kind: str='netcdf', start: float=1627819200.0) -> dict:
+    '''
+    {MRMS-style filename: (gzipped bytes, modified epoch seconds)}, one file every two minutes from start
+    '''
+    encode = grib2_bytes if kind == 'grib2' else netcdf_bytes
+    extension = 'grib2' if kind == 'grib2' else 'nc'
+    files = {}
+    for i in range(count):
+        modified = start + 120 * i
+        name = time_name(modified) + f'.{extension}.gz'
+        files[name] = (gzip.compress(encode(synthetic_grid(shape, seed=i)), mtime=0), modified)
+    return files
+
+
+def time_name(epoch: float) -> str:
+    return 'MRMS_MESH_00.50_' + time.strftime('%Y%m%d-%H%M%S', time.gmtime(epoch))
+
+
+def netcdf_nodes(count: int, shape: Tuple[int, int]) -> list:
+    nodes = []
+    for i in range(count):
+        filepath = get_temp_file(prefix='fixture')
+        with open(filepath, 'wb') as f:
+            f.write(netcdf_bytes(synthetic_grid(shape, seed=i)))
+        nodes.append(FileNode(filepath=filepath))
+    return nodes
@@ -2,12 +2,27 @@ import sys
 from geoetl.utils import timeit
 from .test_gdalwarp import main as test_gdalwarp
 from .test_etl_chain import main as test_etl_chain
+from .test_index import main as test_index
+from .test_cache import main as test_cache
+from .test_aggregate import main as test_aggregate
+from .test_rolling import main as test_rolling
+from .test_download import main as test_download
+from .test_reproject import main as test_reproject
+from .test_pipeline import main as test_pipeline
+from .test_metrics import main as test_metrics
+from .test_sinks import main as test_sinks
+from .test_crawler import main as test_crawler
+from .test_workqueue import main as test_workqueue
+from .test_cli import main as test_cli
+from .test_metadata import main as test_metadata
+from .test_scratch import main as test_scratch
+from .test_rules import main as test_rules
 
 
 def main():
-    tests = test_gdalwarp + test_etl_chain
+    tests = test_gdalwarp() + test_etl_chain() + test_index() + test_cache() + test_aggregate() + test_rolling() + test_download() + test_reproject() + test_pipeline() + test_metrics() + test_sinks() + test_crawler() + test_workqueue() + test_cli() + test_metadata() + test_scratch() + test_rules()
     
-    results, t = timeit(map(lambda test: test(), tests))
+    results, t = timeit(lambda: [test() for test in tests])
     num_passed = len([r for r in results if r])
 
     print(f'{num_passed} out of {len(results)} tests passed.')
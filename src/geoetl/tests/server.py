@@ -0,0 +1,126 @@
+import re
+import time
+import threading
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body: bool):
+        server = self.server
+        server.requests.append((self.command, self.path, dict(self.headers), self.client_address))
+        if self.path not in server.files:
+            self.send_error(404)
+            return
+
+        content, headers = server.files[self.path]
+        if ('ETag' in headers and self.headers.get('If-None-Match') == headers['ETag']) or (
+                'Last-Modified' in headers and self.headers.get('If-Modified-Since') == headers['Last-Modified']):
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, status = 0, 200
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match:
+            start, status = int(match.group(1)), 206
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        if not body:
+            return
+
+        if self.path in server.flaky:
+            # Drop the connection halfway through the first response
+            server.flaky.discard(self.path)
+            self.wfile.write(content[start:start + (len(content) - start) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(content[start:])
+
+
+def apache_listing_html(path: str, entries) -> bytes:
+    '''
+    Apache-style "Index of" page for entries of (name, size, modified epoch seconds), size None for directories
+    '''
+    rows = ''.join(
+        f'<tr><td valign="top"><img src="/icons/unknown.gif" alt="[   ]"></td><td><a href="{name}">{name}</a></td>'
+        f'<td align="right">{time.strftime("%Y-%m-%d %H:%M", time.gmtime(modified))}  </td><td align="right">{"-" if size is None else size}</td><td>&nbsp;</td></tr>\n'
+        for name, size, modified in entries)
+    return (
+        f'<html><head><title>Index of {path.rstrip("/")}</title></head><body><h1>Index of {path.rstrip("/")}</h1>\n'
+        '<table><tr><th valign="top"><img src="/icons/blank.gif" alt="[ICO]"></th><th><a href="?C=N;O=D">Name</a></th>'
+        '<th><a href="?C=M;O=A">Last modified</a></th><th><a href="?C=S;O=A">Size</a></th><th><a href="?C=D;O=A">Description</a></th></tr>\n'
+        '<tr><th colspan="5"><hr></th></tr>\n'
+        f'{rows}<tr><th colspan="5"><hr></th></tr>\n</table></body></html>').encode()
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose, e.g. after rejecting headers
+        pass
+
+
+class StandInServer:
+    '''
+    Local HTTP server for tests, serves files = {path: (bytes, headers)} with Range support.
+    Paths in flaky drop their first response halfway through the body
+    '''
+    def __init__(self, files: dict=None, flaky: set=None):
+        self.httpd = QuietHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.httpd.files = files or {}
+        self.httpd.flaky = set(flaky or ())
+        self.httpd.requests = []
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}'
+
+    @property
+    def requests(self) -> list:
+        return self.httpd.requests
+
+    def add_directory(self, path: str, files: dict, directories: dict=None) -> None:
+        '''
+        Serve files = {name: (bytes, modified epoch seconds)} under path, with an Apache listing at path
+        that also lists the subdirectories = {name: modified epoch seconds}. The listing has a Last-Modified header
+        '''
+        path = path.rstrip('/') + '/'
+        for name, (content, modified) in files.items():
+            content_type = 'application/x-gzip' if name.endswith('.gz') else 'application/octet-stream'
+            self.httpd.files[path + name] = (content, {'Content-Type': content_type, 'Last-Modified': formatdate(modified, usegmt=True)})
+
+        entries = [(name.rstrip('/') + '/', None, modified) for name, modified in (directories or {}).items()]
+        entries += [(name, len(content), modified) for name, (content, modified) in files.items()]
+        html = apache_listing_html(path, entries)
+        headers = {'Content-Type': 'text/html', 'Last-Modified': formatdate(max([modified for _, _, modified in entries] or [0]), usegmt=True)}
+        self.httpd.files[path] = self.httpd.files[path.rstrip('/')] = (html, headers)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
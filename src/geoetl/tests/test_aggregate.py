@@ -0,0 +1,116 @@
+import netCDF4
+import numpy as np
+import xarray as xr
+from geoetl.utils import test_decorator, get_temp_file
+from geoetl.api import FileNode
+from geoetl.geoapi import NetcdfTransform, NetcdfWriter, SumAccumulator, MaxAccumulator, MinAccumulator, CountAccumulator, MeanAccumulator, tree_reduce
+
+
+def make_grid_node(values: np.ndarray) -> FileNode:
+    lat, lon = values.shape
+    dataset = xr.Dataset(
+        {'Band1': (('lat', 'lon'), values)},
+        coords={'lat': np.linspace(20, 50, lat), 'lon': np.linspace(-130, -60, lon)})
+    filepath = get_temp_file(prefix='grid')
+    dataset.to_netcdf(filepath)
+    return FileNode(filepath=filepath)
+
+
+def read_band(node: FileNode, band: str='Band1') -> np.ndarray:
+    with NetcdfTransform.get_xr_dataset(node.filepath) as dataset:
+        return np.array(NetcdfTransform.get_band_ref(dataset, band).values)
+
+
+@test_decorator
+def is_sum_accumulator_correct():
+    rng = np.random.default_rng(0)
+    grids = [rng.uniform(-5, 40, size=(12, 20)) for _ in range(4)]
+    grids[1][3, 4] = np.nan
+
+    accumulator = SumAccumulator(remove_nodes=True)
+    for grid in grids:
+        accumulator.add(make_grid_node(grid))
+    result_node = accumulator.result()
+
+    expected = np.nansum(grids, axis=0)
+    expected[expected < 0] = 0
+    result = read_band(result_node)
+    result_node.truncate()
+
+    return accumulator.count == len(grids) and np.array_equal(result, expected.astype(np.uint8))
+
+
+@test_decorator
+def is_netcdf_absolute_chunked():
+    rng = np.random.default_rng(1)
+    grid = rng.uniform(-5, 40, size=(50, 30))
+    grid[7, 3] = np.nan
+    source_node = make_grid_node(grid)
+
+    destination_filepath = get_temp_file(prefix='chunked')
+    with NetcdfTransform.get_xr_dataset(source_node.filepath) as dataset:
+        chunked = NetcdfTransform.get_absolute_chunked(dataset, ['Band1'], chunk_rows=8)
+        is_lazy = chunked.Band1.chunks[0] == (8,) * 6 + (2,)
+        chunked.to_netcdf(destination_filepath)
+    source_node.truncate()
+
+    destination_node = FileNode(filepath=destination_filepath)
+    result = read_band(destination_node)
+    destination_node.truncate()
+
+    # A leading time axis isn't the one split into rows
+    timed = xr.Dataset({'Band1': (('time', 'lat', 'lon'), grid[np.newaxis])})
+    is_row_chunked = NetcdfTransform.get_absolute_chunked(timed, ['Band1'], chunk_rows=8).Band1.chunks == ((1,), (8,) * 6 + (2,), (30,))
+
+    expected = np.nan_to_num(np.clip(grid, 0, None)).astype(np.uint8)
+    return is_lazy and is_row_chunked and np.array_equal(result, expected)
+
+
+@test_decorator
+def is_netcdf_writer_packed():
+    rng = np.random.default_rng(2)
+    grid = rng.uniform(0, 80, size=(40, 60))
+    grid[5, 5] = np.nan
+    source_node = make_grid_node(grid)
+
+    writer = NetcdfWriter(chunk_rows=16, dtype=np.int16, scale_factor=0.01)
+    destination_node = FileNode(filepath=get_temp_file(prefix='packed'))
+    with NetcdfTransform.get_xr_dataset(source_node.filepath) as dataset:
+        writer.write(dataset, destination_node.filepath)
+    source_node.truncate()
+
+    with netCDF4.Dataset(destination_node.filepath) as dataset:
+        variable = dataset['Band1']
+        is_encoded = variable.filters()['zlib'] and variable.filters()['shuffle'] and variable.chunking() == [16, 60] and variable.dtype == np.int16
+
+    result = read_band(destination_node)
+    destination_node.truncate()
+    is_missing_kept = np.isnan(result[5, 5])
+    return is_encoded and is_missing_kept and np.allclose(np.nan_to_num(result), np.nan_to_num(grid), atol=0.005)
+
+
+@test_decorator
+def is_tree_reduce_correct():
+    rng = np.random.default_rng(4)
+    grids = [rng.uniform(0, 30, size=(12, 20)) for _ in range(7)]
+    grids[2][1, 1] = grids[5][1, 1] = np.nan
+    nodes = [make_grid_node(grid) for grid in grids]
+
+    with np.errstate(invalid='ignore'):
+        expected = {
+            SumAccumulator: np.nansum(grids, axis=0), MaxAccumulator: np.nanmax(grids, axis=0), MinAccumulator: np.nanmin(grids, axis=0),
+            CountAccumulator: np.sum(~np.isnan(grids), axis=0), MeanAccumulator: np.nanmean(grids, axis=0)}
+
+    is_correct = True
+    for make_accumulator, values in expected.items():
+        result_node = tree_reduce(nodes, make_accumulator, partitions=3, fan_in=2, max_workers=2)
+        is_correct &= np.array_equal(read_band(result_node), values.astype(np.uint8))
+        result_node.truncate()
+
+    for node in nodes:
+        node.truncate()
+    return is_correct
+
+
+def main():
+    return [is_sum_accumulator_correct, is_netcdf_absolute_chunked, is_netcdf_writer_packed, is_tree_reduce_correct]
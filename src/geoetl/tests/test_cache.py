@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+from geoetl.utils import test_decorator
+from geoetl.api import Transformer, CLIBaseTransform
+from geoetl.cache import ListingManifest, NodeCache
+from .test_index import LocalListing, LocalIndex, AcceptAll, RepeatTransform, read_nodes
+
+
+class CountingListing(LocalListing):
+    downloads = 0
+
+    def key(self) -> str:
+        # Stands in for size and modified time
+        return f'{self.url}|{self.payload.hex()}'
+
+    def download(self, downloader=None):
+        CountingListing.downloads += 1
+        return super(CountingListing, self).download(downloader)
+
+
+class CountingIndex(LocalIndex):
+    payloads = [b'a', b'b', b'c']
+
+    def fetch_listings(self):
+        self.listings = [CountingListing(f'cached{i}', payload) for i, payload in enumerate(self.payloads)]
+
+
+@test_decorator
+def is_cached_index_incremental():
+    directory = tempfile.mkdtemp(prefix='test_cache_', dir=os.environ.get('ETL_DIR', './'))
+    try:
+        manifest_filepath = os.path.join(directory, 'manifest.json')
+        cache = NodeCache(os.path.join(directory, 'cache'), max_bytes=10**6)
+        transformer = Transformer(transforms=[RepeatTransform, RepeatTransform], cache=cache)
+
+        def run(payloads, new_only=False):
+            CountingListing.downloads = 0
+            index = CountingIndex(url='', validator=AcceptAll(), transformer=transformer, manifest=ListingManifest(manifest_filepath))
+            index.payloads = payloads
+            index.fetch_listings()
+            return read_nodes(index.transform_index(new_only=new_only)), CountingListing.downloads
+
+        first = run([b'a', b'b', b'c'])
+        second = run([b'a', b'b', b'c'])
+        third = run([b'a', b'b', b'C'], new_only=True)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    is_reused = first == ([b'aaaa', b'bbbb', b'cccc'], 3) and second == (first[0], 0)
+    is_incremental = third == ([b'CCCC'], 1)
+    return is_reused and is_incremental
+
+
+@test_decorator
+def is_cache_evicted():
+    directory = tempfile.mkdtemp(prefix='test_evicted_cache_', dir=os.environ.get('ETL_DIR', './'))
+    try:
+        cache = NodeCache(directory, max_bytes=10)
+        transformer = Transformer(transforms=[RepeatTransform], cache=cache)
+
+        for i in range(5):
+            listing = LocalListing(f'evicted{i}', b'xxxx')
+            read_nodes([transformer.transformed_node(key=listing.key(), source=listing.download)])
+
+        return len(os.listdir(cache.directory)) == 1
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class InProcessCLI(CLIBaseTransform):
+    '''
+    Stands in for an engine running the same command another way
+    '''
+
+
+@test_decorator
+def is_signature_engine_specific():
+    command = 'gzip -dc {source} > {destination}'
+    cli = CLIBaseTransform.make('Gunzip', 'gzip', command)
+    in_process = InProcessCLI.make('Gunzip', 'gzip', command)
+    return cli.signature() == CLIBaseTransform.make('Gunzip', 'gzip', command).signature() and cli.signature() != in_process.signature()
+
+
+def main():
+    return [is_cached_index_incremental, is_cache_evicted, is_signature_engine_specific]
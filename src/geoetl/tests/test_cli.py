@@ -0,0 +1,121 @@
+import os
+import sys
+import gzip
+import time
+from geoetl.utils import test_decorator, get_temp_file
+from geoetl.api import FileNode, Transformer, CLIBaseTransform, GunzipTransform, UnzipTransform, Index
+from geoetl.cli import CommandError, CommandPool, format_argv
+from .test_index import AcceptAll, LocalListing
+
+# Gunzips every source/destination pair of argv in one process
+GUNZIP_PAIRS = (f'{sys.executable} -c "import sys, gzip, shutil; '
+                '[shutil.copyfileobj(gzip.open(s), open(d, \'wb\')) for s, d in zip(sys.argv[1::2], sys.argv[2::2])]" {pairs}')
+
+CLIGunzip = CLIBaseTransform.make('CLIGunzip', 'gzip', 'gzip -dc {source} > {destination}')
+CLIGunzipBatch = CLIBaseTransform.make('CLIGunzipBatch', 'gzip', 'gzip -dc {source} > {destination}', batch_command=GUNZIP_PAIRS)
+
+
+def gz_node(content: bytes) -> FileNode:
+    filepath = get_temp_file(prefix='cli') + '.gz'
+    with open(filepath, 'wb') as f:
+        f.write(gzip.compress(content))
+    return FileNode(filepath=filepath)
+
+
+def read_node(node: FileNode) -> bytes:
+    with open(node.filepath, 'rb') as f:
+        content = f.read()
+    node.truncate()
+    return content
+
+
+@test_decorator
+def is_command_error_raised():
+    node = gz_node(b'x')
+    with open(node.filepath, 'wb') as f:
+        f.write(b'not gzip')
+    try:
+        CLIGunzip(node).transform()
+        is_raised = False
+    except CommandError as e:
+        is_raised = e.exit_code != 0 and 'not in gzip format' in e.stderr
+
+    pool = CommandPool(max_workers=1, timeout=0.2)
+    began = time.time()
+    try:
+        pool.run(['sleep', '5'])
+        is_killed = False
+    except CommandError as e:
+        is_killed = e.exit_code is None and time.time() - began < 2
+    node.truncate()
+
+    argv, stdout_filepath = format_argv('cmd -i {source} > {destination}', source='a b', destination='c;d')
+    return is_raised and is_killed and argv == ['cmd', '-i', 'a b'] and stdout_filepath == 'c;d'
+
+
+@test_decorator
+def is_batch_transformed():
+    contents = [f'file {i}'.encode() * 50 for i in range(5)]
+    sources = [gz_node(content) for content in contents]
+    per_file = [read_node(node) for node in CLIGunzip.transform_batch(sources)]
+
+    CLIGunzipBatch.batch_size = 2
+    batched = [read_node(node) for node in CLIGunzipBatch.transform_batch(sources)]
+    for node in sources:
+        node.truncate()
+
+    nodes = [gz_node(content) for content in contents[:2]]
+    with open(nodes[1].filepath, 'wb') as f:
+        f.write(b'not gzip')
+    try:
+        CLIGunzip.transform_batch(nodes)
+        is_raised = False
+    except CommandError:
+        is_raised = True
+    for node in nodes:
+        node.truncate()
+    return per_file == contents and batched == contents and is_raised
+
+
+@test_decorator
+def is_index_batch_mode():
+    contents = [f'listing {i}'.encode() * 50 for i in range(5)]
+    # Compressed twice, once for the in-process step and once for the batched CLI step
+    listings = [LocalListing(f'file{i}', gzip.compress(gzip.compress(content))) for i, content in enumerate(contents)]
+    index = Index('local://', AcceptAll(), Transformer([GunzipTransform, CLIGunzipBatch]), mode='batch', max_workers=2)
+    index.batch_size = 2
+    index.listings = listings + [LocalListing('missing', None)]
+    nodes = index.transform_index()
+    keys = [node.metadata['key'] for node in nodes]
+    return [read_node(node) for node in nodes] == contents and keys == [listing.key() for listing in listings] and len(index.failures) == 1
+
+
+def etl_dir_entries() -> set:
+    return set(os.listdir(os.environ.get('ETL_DIR', './')))
+
+
+@test_decorator
+def is_process_failure_reported():
+    before = etl_dir_entries()
+    index = Index('local://', AcceptAll(), Transformer([CLIGunzip]), mode='process', max_workers=2)
+    index.listings = [LocalListing('good', gzip.compress(b'good' * 50)), LocalListing('bad', b'not gzip')]
+    values = [read_node(node) for node in index.transform_index()]
+    errors = [error for _, error in index.failures]
+    return values == [b'good' * 50] and len(errors) == 1 and isinstance(errors[0], CommandError) and \
+        'not in gzip format' in errors[0].stderr and etl_dir_entries() == before
+
+
+@test_decorator
+def is_failed_batch_cleaned():
+    before = etl_dir_entries()
+    listings = [LocalListing(f'twice{i}', gzip.compress(gzip.compress(b'z' * 50))) for i in range(3)]
+    # Fails in the second step, after the first one wrote its outputs
+    listings[1] = LocalListing('once', gzip.compress(b'z' * 50))
+    index = Index('local://', AcceptAll(), Transformer([UnzipTransform, UnzipTransform]), mode='batch', max_workers=2)
+    index.listings = listings
+    nodes = index.transform_index()
+    return nodes == [] and len(index.failures) == 3 and etl_dir_entries() == before
+
+
+def main():
+    return [is_command_error_raised, is_batch_transformed, is_index_batch_mode, is_process_failure_reported, is_failed_batch_cleaned]
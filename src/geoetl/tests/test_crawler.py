@@ -0,0 +1,71 @@
+import os
+from geoetl.utils import test_decorator, get_temp_file
+from geoetl.api import Transformer, Validator, GunzipTransform
+from geoetl.cache import DirectoryCache
+from geoetl.crawler import ApacheCrawler, ApacheTreeIndex
+from .server import StandInServer
+from .fixtures import mrms_files
+
+START = 1627819200.0
+
+
+class WindowValidator(Validator):
+    def __init__(self, product: str, start: float, end: float):
+        self.window = {'product': product, 'start': start, 'end': end}
+        self.seen = []
+
+    def query(self):
+        return self.window
+
+    def is_valid(self, listing) -> bool:
+        self.seen.append(listing.name)
+        return True
+
+
+def serve_tree(server: StandInServer) -> dict:
+    mesh = mrms_files(4, (10, 20), start=START)
+    qpe = {name.replace('MESH_00.50', 'QPE_01H'): value for name, value in mrms_files(2, (10, 20), start=START).items()}
+    server.add_directory('/data/', {'readme.txt': (b'hello', START)}, directories={'MESH': START, 'QPE': START})
+    server.add_directory('/data/MESH/', mesh)
+    server.add_directory('/data/QPE/', {}, directories={'01H': START})
+    server.add_directory('/data/QPE/01H/', qpe)
+    return mesh
+
+
+@test_decorator
+def is_tree_crawled_and_cached():
+    cache_filepath = get_temp_file(prefix='directories') + '.json'
+    with StandInServer() as server:
+        serve_tree(server)
+        listing_index = ApacheCrawler(server.url + '/data', max_workers=3, cache=DirectoryCache(cache_filepath)).crawl()
+        first_requests = len(server.requests)
+
+        recrawled = ApacheCrawler(server.url + '/data', max_workers=3, cache=DirectoryCache(cache_filepath)).crawl()
+        conditional = [request for request in server.requests[first_requests:] if 'If-Modified-Since' in request[2]]
+
+    os.remove(cache_filepath)
+    # readme.txt has no time in its name, it is filed under its directory, the root ''
+    is_indexed = sorted(listing_index.products) == ['', 'MRMS_MESH_00.50', 'MRMS_QPE_01H']
+    is_cached = len(conditional) == 4 and [listing.url for listing in recrawled.query()] == [listing.url for listing in listing_index.query()]
+    is_windowed = [listing.name for listing in listing_index.query('MRMS_MESH_00.50', START + 120, START + 360)] == [
+        'MRMS_MESH_00.50_20210801-120200.nc.gz', 'MRMS_MESH_00.50_20210801-120400.nc.gz']
+    return len(listing_index) == 7 and is_indexed and is_cached and is_windowed
+
+
+@test_decorator
+def is_tree_index_queried():
+    with StandInServer() as server:
+        mesh = serve_tree(server)
+        validator = WindowValidator('MRMS_MESH_00.50', START, START + 240)
+        index = ApacheTreeIndex(server.url + '/data/', validator, Transformer([GunzipTransform]))
+        index.fetch_listings()
+        nodes = index.transform_index()
+
+    expected = sorted(mesh)[:2]
+    for node in nodes:
+        node.truncate()
+    return validator.seen == expected and len(nodes) == 2 and len(index.listings) == 7
+
+
+def main():
+    return [is_tree_crawled_and_cached, is_tree_index_queried]
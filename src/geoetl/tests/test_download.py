@@ -0,0 +1,76 @@
+import os
+from geoetl.utils import test_decorator, get_temp_file
+from geoetl.api import APISource, Transformer, Validator
+from geoetl.cache import HeaderCache
+from geoetl.download import Downloader
+from .server import StandInServer
+
+
+PAYLOAD = bytes(range(256)) * 4096
+
+
+@test_decorator
+def is_download_resumed():
+    files = {'/flaky.grib2.gz': (PAYLOAD, {'Content-Type': 'application/x-gzip'})}
+    with StandInServer(files=files, flaky={'/flaky.grib2.gz'}) as server:
+        filepath = get_temp_file(prefix='download')
+        resp = Downloader(backoff=0).download(server.url + '/flaky.grib2.gz', filepath)
+        ranges = [headers.get('Range') for _, _, headers, _ in server.requests]
+        encodings = {headers.get('Accept-Encoding') for _, _, headers, _ in server.requests}
+
+    with open(filepath, 'rb') as f:
+        content = f.read()
+    os.remove(filepath)
+
+    return content == PAYLOAD and resp.status_code == 206 and ranges == [None, f'bytes={len(PAYLOAD) // 2}-'] and encodings == {'identity'}
+
+
+@test_decorator
+def is_download_pooled():
+    files = {f'/file{i}': (PAYLOAD[:1000 * (i + 1)], {}) for i in range(5)}
+    downloader = Downloader()
+    with StandInServer(files=files) as server:
+        for path, (content, _) in files.items():
+            filepath = get_temp_file(prefix='download')
+            downloader.download(server.url + path, filepath)
+            with open(filepath, 'rb') as f:
+                is_correct = f.read() == content
+            os.remove(filepath)
+            if not is_correct:
+                return False
+        client_ports = {client_address for _, _, _, client_address in server.requests}
+
+    # Every request reused the same keep-alive connection
+    return len(client_ports) == 1
+
+
+class GzipValidator(Validator):
+    def is_header_valid(self, headers) -> bool:
+        return headers.get('Content-Type') == 'application/x-gzip'
+
+
+@test_decorator
+def is_header_validated_before_body():
+    files = {
+        '/product.grib2.gz': (PAYLOAD, {'Content-Type': 'application/x-gzip', 'ETag': '"v1"'}),
+        '/product.html': (PAYLOAD, {'Content-Type': 'text/html'})}
+    header_cache = HeaderCache(get_temp_file(prefix='headers'))
+    with StandInServer(files=files) as server:
+        def source(path):
+            return APISource(url=server.url + path, validator=GzipValidator(), transformer=Transformer(transforms=[]),
+                             downloader=Downloader(), header_cache=header_cache)
+
+        rejected = source('/product.html').download()
+        first = source('/product.grib2.gz').download()
+        unchanged = source('/product.grib2.gz').download()
+        conditional = server.requests[-1][2].get('If-None-Match')
+
+    is_downloaded = first is not None and first.read() == PAYLOAD
+    first.truncate()
+    if os.path.exists(header_cache.filepath):
+        os.remove(header_cache.filepath)
+    return rejected is None and is_downloaded and unchanged is None and conditional == '"v1"'
+
+
+def main():
+    return [is_download_resumed, is_download_pooled, is_header_validated_before_body]
@@ -1,9 +1,12 @@
+import os
+import numpy as np
 from io import BytesIO
-from geoetl.utils import test_decorator
-from geoetl.api import FileNode, Transformer, Transform, CLIBaseTransform, UnzipTransform
+from geoetl.utils import test_decorator, get_temp_file
+from geoetl.cli import CommandError
+from geoetl.api import FileNode, Transformer, Transform, CLIBaseTransform, UnzipTransform, GzipTransform, GunzipTransform
 
 
-ZipTransform = CLIBaseTransform.make(name='ZipTransform', executable='gzip', command='gzip -c {source} > {destination}')
+ZipTransform = CLIBaseTransform.make(name='ZipTransform', executable='gzip', command='gzip -c {source} > {destination}', stream_command='gzip -c')
 
 
 @test_decorator
@@ -26,5 +29,86 @@ def is_zip_transformer_correct():
     return initial_value == output_value
 
 
+@test_decorator
+def is_zip_transformer_streamed():
+    transformer = Transformer(transforms=[ZipTransform, UnzipTransform, ZipTransform, UnzipTransform], stream=True)
+    initial_value = b'asdfASDF123456789!@#$%^&*();' * 10**4
+    source_filepath = './test_stream_source'
+
+    with open(source_filepath, 'wb') as f:
+        f.write(initial_value)
+
+    output_node = transformer.transformed_node(root=FileNode(filepath=source_filepath))
+    with open(output_node.filepath, 'rb') as f:
+        output_value = f.read()
+
+    output_node.truncate()
+    return initial_value == output_value
+
+
+@test_decorator
+def is_stream_failure_reported():
+    transformer = Transformer(transforms=[UnzipTransform, ZipTransform], stream=True)
+    source_filepath = get_temp_file(prefix='not_gzip')
+    with open(source_filepath, 'wb') as f:
+        f.write(b'not gzip')
+
+    try:
+        transformer.transformed_node(root=FileNode(filepath=source_filepath))
+        is_raised = False
+    except CommandError as e:
+        is_raised = e.argv[0] == 'gunzip' and e.exit_code != 0 and 'not in gzip format' in e.stderr
+    if os.path.exists(source_filepath):
+        os.remove(source_filepath)
+    return is_raised
+
+
+@test_decorator
+def is_native_zip_transformer_in_memory():
+    initial_value = b'asdfASDF123456789!@#$%^&*();' * 10**4
+    native = Transformer(transforms=[GzipTransform, UnzipTransform, GzipTransform, GunzipTransform])
+    mixed = Transformer(transforms=[GzipTransform, UnzipTransform, GzipTransform, UnzipTransform], stream=True)
+
+    native_node = native.transformed_node(root=FileNode(in_memory=True, content=BytesIO(initial_value)))
+    mixed_node = mixed.transformed_node(root=FileNode(in_memory=True, content=BytesIO(initial_value)))
+    mixed_value = mixed_node.read()
+    mixed_node.truncate()
+
+    return native_node.in_memory and native_node.read() == initial_value and mixed_value == initial_value
+
+
+@test_decorator
+def is_materialized_copy_removed():
+    etl_dir = os.environ.get('ETL_DIR', './')
+    before = set(os.listdir(etl_dir))
+    initial_value = b'asdfASDF123456789!@#$%^&*();' * 100
+    root = FileNode(in_memory=True, content=BytesIO(initial_value))
+    output_node = Transformer(transforms=[GzipTransform, UnzipTransform], remove_source=False).transformed_node(root=root)
+    output_value = output_node.read()
+    output_node.truncate()
+    # The caller's root is untouched, the Transformer's disk copy is gone
+    return output_value == initial_value and root.read() == initial_value and set(os.listdir(etl_dir)) == before
+
+
+@test_decorator
+def is_node_buffer_zero_copy():
+    grid = np.arange(12, dtype=np.float32).reshape(3, 4)
+    memory_node = FileNode(in_memory=True, content=BytesIO(grid.tobytes()))
+    disk_node = FileNode(filepath=get_temp_file(prefix='grid'))
+    with open(disk_node.filepath, 'wb') as f:
+        f.write(grid.tobytes())
+
+    memory_array = memory_node.array(np.float32, (3, 4))
+    disk_array = disk_node.array(np.float32, (2, 4), offset=16)
+    is_viewed = np.array_equal(memory_array, grid) and np.array_equal(disk_array, grid[1:])
+    is_shared = np.shares_memory(memory_array, np.frombuffer(memory_node.content.getbuffer(), dtype=np.float32))
+    is_readonly = not memory_array.flags.writeable and not disk_array.flags.writeable
+
+    disk_node.truncate()
+    del memory_array
+    memory_node.truncate()
+    return is_viewed and is_shared and is_readonly and memory_node.buffer().nbytes == 0
+
+
 def main():
-    return [is_zip_transformer_correct]
\ No newline at end of file
+    return [is_zip_transformer_correct, is_zip_transformer_streamed, is_stream_failure_reported, is_native_zip_transformer_in_memory, is_materialized_copy_removed, is_node_buffer_zero_copy]
\ No newline at end of file
@@ -1,13 +1,9 @@
-from io import BytesIO
-from geoetl.geoapi import GDALWarpFactory
-from geoetl.utils import gdalinfo, test_decorator
-from geoetl.api import FileNode, Transformer, UnzipTransform
+import netCDF4
+from geoetl.geoapi import GDALWarpFactory, GDALWarpInProcess, gdalinfo
+from geoetl.utils import test_decorator
 from geoetl.examples.extract_mrms import main as extract_mrms
 
 
-ZipTransform = CLIBaseTransform.make(name='ZipTransform', executable='gzip', command='gzip -c {source} > {destination}')
-
-
 @test_decorator
 def is_gdalwarp_installed():
     return GDALWarpFactory.check_installation()
@@ -15,12 +11,30 @@ def is_gdalwarp_installed():
 
 @test_decorator
 def is_gdalwarp_netcdf():
-    transformer = Transformer(transforms=[UnzipTransform])
-    result_nc_node = transformer.transformed_node(root=extract_mrms())
+    # extract_mrms writes zlib-compressed netCDF directly, there is no gzip layer to undo
+    result_nc_node = extract_mrms()
     result_gdalinfo = gdalinfo(result_nc_node.filepath)
-    
-    return 'netcdf' in result_gdalinfo.get('driverShortName', '')
+    with netCDF4.Dataset(result_nc_node.filepath) as dataset:
+        is_compressed = all(dataset.variables[band['metadata']['']['NETCDF_VARNAME']].filters()['zlib'] for band in result_gdalinfo['bands'])
+    result_nc_node.truncate()
+
+    return 'netcdf' in result_gdalinfo.get('driverShortName', '').lower() and is_compressed
+
+
+@test_decorator
+def is_gdalwarp_engine_selected():
+    default = GDALWarpFactory.make('GDALWarpUngrib')
+    cli = GDALWarpFactory.make('gdalwarp_grib_to_nc', engine='cli')
+
+    return issubclass(default, GDALWarpInProcess) == GDALWarpFactory.has_bindings() and not issubclass(cli, GDALWarpInProcess)
+
+
+@test_decorator
+def is_command_options_excluded():
+    warp = GDALWarpFactory.make('GDALWarpUngrib', engine='cli')
+    vrt_options = warp.command_options(exclude=('-of', '-co')) + ['-of', 'VRT']
+    return vrt_options.count('-of') == 1 and 'netCDF' not in vrt_options and vrt_options[:4] == ['-t_srs', 'EPSG:4326', '-ot', 'Int16']
 
 
 def main():
-    return [is_gdalwarp_installed, is_gdalwarp_netcdf]
\ No newline at end of file
+    return [is_gdalwarp_installed, is_gdalwarp_netcdf, is_gdalwarp_engine_selected, is_command_options_excluded]
\ No newline at end of file
@@ -0,0 +1,125 @@
+import gzip
+import numpy as np
+from geoetl.utils import test_decorator, get_temp_file
+from geoetl.api import FileNode, Transformer, Transform, Validator, Listing, Index, GunzipTransform
+from geoetl.geoapi import ApacheIndex, size_cap, date_window
+from .server import StandInServer
+from .fixtures import mrms_files
+
+
+class LocalListing(Listing):
+    def __init__(self, name: str, payload: bytes):
+        self.name = name
+        self.url = 'local://' + name
+        self.payload = payload
+
+    def download(self, downloader=None) -> FileNode:
+        if self.payload is None:
+            raise Exception('Failed request for ' + self.url)
+
+        filepath = get_temp_file(prefix=self.name)
+        with open(filepath, 'wb') as f:
+            f.write(self.payload)
+        return FileNode(filepath=filepath)
+
+
+class LocalIndex(Index):
+    def fetch_listings(self):
+        self.listings = [LocalListing(f'listing{i}', str(i).encode()) for i in range(16)]
+        # Unreachable listing, should be isolated
+        self.listings.insert(3, LocalListing('broken', None))
+
+
+class AcceptAll(Validator):
+    def is_valid(self, listing) -> bool:
+        return True
+
+
+class RepeatTransform(Transform):
+    def transform(self) -> FileNode:
+        with open(self.source_filepath, 'rb') as f:
+            content = f.read()
+
+        destination_filepath = get_temp_file(prefix='RepeatTransform')
+        with open(destination_filepath, 'wb') as f:
+            f.write(content * 2)
+        return FileNode(filepath=destination_filepath)
+
+
+def read_nodes(nodes):
+    values = []
+    for node in nodes:
+        with open(node.filepath, 'rb') as f:
+            values.append(f.read())
+        node.truncate()
+    return values
+
+
+def run_index(mode: str):
+    index = LocalIndex(url='', validator=AcceptAll(), transformer=Transformer(transforms=[RepeatTransform]), mode=mode, max_workers=4)
+    index.fetch_listings()
+    return read_nodes(index.transform_index()), index.failures
+
+
+@test_decorator
+def is_parallel_index_ordered():
+    expected = [str(i).encode() * 2 for i in range(16)]
+    results = [run_index(mode) for mode in Index.modes]
+
+    return all(values == expected and [listing.name for listing, _ in failures] == ['broken'] for values, failures in results)
+
+
+@test_decorator
+def is_apache_index_offline():
+    files = mrms_files(3, (20, 40))
+    with StandInServer() as server:
+        server.add_directory('/mesh/', files)
+        index = ApacheIndex(server.url + '/mesh/', AcceptAll(), Transformer([GunzipTransform]))
+        index.fetch_listings()
+        nodes = index.transform_index()
+
+    is_listed = [listing.name for listing in index.listings] == sorted(files)
+    is_dated = [listing.timestamp() for listing in index.listings] == [files[name][1] for name in sorted(files)]
+    is_downloaded = [node.read() for node in nodes] == [gzip.decompress(files[name][0]) for name in sorted(files)]
+    for node in nodes:
+        node.truncate()
+    return is_listed and is_dated and is_downloaded
+
+
+class WindowMask(Validator):
+    def __init__(self, max_size: int, start: float, end: float):
+        self.predicates = [size_cap(max_size), date_window(start, end)]
+        self.seen = []
+
+    def mask(self, store):
+        return np.logical_and.reduce([predicate(store) for predicate in self.predicates])
+
+    def is_valid(self, listing) -> bool:
+        self.seen.append(listing.name)
+        return True
+
+
+@test_decorator
+def is_listing_store_masked():
+    files = mrms_files(6, (20, 40))
+    names = sorted(files)
+    # Pad one file past the size cap
+    oversize = names[2]
+    files[oversize] = (files[oversize][0] + bytes(4096), files[oversize][1])
+    start = files[names[1]][1]
+
+    with StandInServer() as server:
+        server.add_directory('/mesh/', files)
+        validator = WindowMask(max_size=4096, start=start, end=start + 3 * 120)
+        index = ApacheIndex(server.url + '/mesh', validator, Transformer([]))
+        index.fetch_listings()
+        selected = list(index.select_listings())
+
+    store = index.listings
+    is_columnar = isinstance(store.epochs, np.ndarray) and len(set(map(id, store.base_urls))) == 1 and store.url(0) == server.url + '/mesh/' + names[0]
+    is_compact = not hasattr(selected[0], '__dict__')
+    return is_columnar and is_compact and validator.seen == [names[1], names[3]] and [listing.url for listing in selected] == [store.url(1), store.url(3)]
+
+
+def main():
+    return [is_parallel_index_ordered, is_apache_index_offline, is_listing_store_masked]
@@ -0,0 +1,42 @@
+import os
+import numpy as np
+from geoetl.utils import test_decorator
+from geoetl.geoapi import NetcdfTransform
+from geoetl.metadata import get_metadata, clear_metadata_cache, _read_metadata
+from .test_aggregate import make_grid_node, read_band
+
+
+@test_decorator
+def is_metadata_cached():
+    clear_metadata_cache()
+    node = make_grid_node(np.zeros((31, 71)))
+    metadata = get_metadata(node.filepath)
+    is_hit = get_metadata(node.filepath) is metadata and _read_metadata.cache_info().hits == 1
+
+    # lat 20..50 and lon -130..-60 in 1 degree steps
+    is_georeferenced = np.allclose(metadata.geotransform, (-130.5, 1.0, 0.0, 50.5, 0.0, -1.0))
+
+    # A rewritten file has a new mtime and size and is read again
+    os.remove(node.filepath)
+    node = make_grid_node(np.zeros((5, 6)))
+    is_reread = get_metadata(node.filepath).shape == (5, 6)
+    node.truncate()
+    return metadata.bands == ('Band1',) and metadata.shape == (31, 71) and is_hit and is_georeferenced and is_reread
+
+
+@test_decorator
+def is_netcdf_transform_lazy():
+    grid = np.array([[-3.0, 4.0], [np.nan, 300.0]])
+    node = make_grid_node(grid)
+    transform = NetcdfTransform(node)
+    # Nothing is read until the bands are needed
+    is_lazy = transform._bands is None
+    result_node = transform.transform()
+    result = read_band(result_node)
+    result_node.truncate()
+    node.truncate()
+    return is_lazy and transform.bands == ['Band1'] and np.array_equal(result, np.array([[0, 4], [0, 300]]).astype(np.uint8))
+
+
+def main():
+    return [is_metadata_cached, is_netcdf_transform_lazy]
@@ -0,0 +1,41 @@
+import json
+from io import BytesIO
+from geoetl.utils import test_decorator, get_temp_file
+from geoetl.api import FileNode, Transformer, CLIBaseTransform, GzipTransform, UnzipTransform
+from geoetl.download import Downloader
+from geoetl.metrics import Metrics
+from .server import StandInServer
+
+
+ZipTransform = CLIBaseTransform.make(name='ZipTransform', executable='gzip', command='gzip -c {source} > {destination}', stream_command='gzip -c')
+
+
+@test_decorator
+def is_transformer_instrumented():
+    hooked = []
+    metrics = Metrics(hooks=[hooked.append])
+    initial_value = b'0123456789' * 10**4
+
+    transformer = Transformer(transforms=[GzipTransform, UnzipTransform, ZipTransform, UnzipTransform], stream=True, metrics=metrics)
+    transformer.transformed_node(root=FileNode(in_memory=True, content=BytesIO(initial_value))).truncate()
+
+    with StandInServer(files={'/file': (initial_value, {})}) as server:
+        filepath = get_temp_file(prefix='metrics')
+        Downloader(metrics=metrics).download(server.url + '/file', filepath)
+        FileNode(filepath=filepath).truncate()
+
+    summary = json.loads(metrics.to_json())
+    stages = summary['stages']
+    prometheus = metrics.to_prometheus()
+
+    is_recorded = len(hooked) == 3 and set(stages) == {'GzipTransform', 'UnzipTransform | ZipTransform | UnzipTransform'}
+    is_sized = stages['GzipTransform']['input_bytes'] == len(initial_value) and summary['downloads']['bytes'] == len(initial_value)
+    is_exported = 'geoetl_stage_wall_seconds_total{stage="GzipTransform"}' in prometheus and 'geoetl_downloads_total 1' in prometheus
+    # The high-water mark is process-wide, the growth is the stage's own share of it
+    is_rss_split = all(0 <= stage['rss_growth_bytes'] <= stage['peak_rss_bytes'] for stage in stages.values()) and \
+        '# TYPE geoetl_stage_rss_growth_bytes gauge' in prometheus
+    return is_recorded and is_sized and is_exported and is_rss_split
+
+
+def main():
+    return [is_transformer_instrumented]
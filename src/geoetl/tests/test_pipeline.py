@@ -0,0 +1,57 @@
+import os
+from io import BytesIO
+from geoetl.utils import test_decorator, get_temp_file
+from geoetl.api import FileNode, Transform, GzipTransform, GunzipTransform
+from geoetl.pipeline import Pipeline
+from .test_index import RepeatTransform
+
+
+class UpperTransform(Transform):
+    calls = 0
+
+    def transform(self) -> FileNode:
+        UpperTransform.calls += 1
+        destination_filepath = get_temp_file(prefix='UpperTransform')
+        with open(destination_filepath, 'wb') as f:
+            f.write(self.source_node.read().upper())
+        return FileNode(filepath=destination_filepath)
+
+
+def join(nodes):
+    return FileNode(in_memory=True, content=BytesIO(b'|'.join(node.read() for node in nodes)))
+
+
+@test_decorator
+def is_pipeline_fanned_out():
+    source_filepath = get_temp_file(prefix='pipeline')
+    with open(source_filepath, 'wb') as f:
+        f.write(b'abc')
+
+    intermediates = []
+
+    def track(nodes):
+        intermediates.append(nodes[0].filepath)
+        return join(nodes)
+
+    pipeline = (
+        Pipeline(max_workers=4)
+        .add('upper', UpperTransform)
+        .add('gzip', GzipTransform, parents='upper')
+        .add('gunzip', GunzipTransform, parents='gzip')
+        .add('repeat', RepeatTransform, parents='upper')
+        .add('tracked', track, parents='upper')
+        .add('joined', join, parents=['gunzip', 'tracked']))
+
+    UpperTransform.calls = 0
+    outputs = pipeline.run(FileNode(filepath=source_filepath))
+    values = {name: node.read() for name, node in outputs.items()}
+    for node in outputs.values():
+        node.truncate()
+
+    is_shared = UpperTransform.calls == 1 and values == {'repeat': b'ABCABC', 'joined': b'ABC|ABC'}
+    is_released = not os.path.exists(source_filepath) and not os.path.exists(intermediates[0])
+    return is_shared and is_released
+
+
+def main():
+    return [is_pipeline_fanned_out]
@@ -0,0 +1,38 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from geoetl.utils import test_decorator
+from geoetl.reproject import ReprojectionIndex, ReprojectionCache
+
+
+@test_decorator
+def is_reprojection_index_cached():
+    # Source grid in 0-360 longitudes (as in MRMS grib2), target in -180-180
+    source_geotransform = (180.0, 1.0, 0, 60.0, 0, -1.0)
+    target_geotransform = (-180.0, 1.0, 0, 60.0, 0, -1.0)
+    shape = (40, 90)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return ReprojectionIndex.compute(source_geotransform, shape, target_geotransform, (40, 100), lambda x, y: (x + 360, y))
+
+    directory = tempfile.mkdtemp(prefix='test_reprojection_', dir=os.environ.get('ETL_DIR', './'))
+    try:
+        signature = ReprojectionCache.signature(source_geotransform, shape)
+        ReprojectionCache(directory).get(signature, compute)
+        index = ReprojectionCache(directory).get(signature, compute)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    stack = np.arange(3 * 40 * 90, dtype=np.float64).reshape(3, 40, 90)
+    warped = index.warp(stack, fill=-1)
+    expected = np.full((3, 40, 100), -1.0)
+    expected[..., :90] = stack
+
+    return len(calls) == 1 and np.array_equal(warped, expected)
+
+
+def main():
+    return [is_reprojection_index_cached]
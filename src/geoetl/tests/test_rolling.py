@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from geoetl.utils import test_decorator
+from geoetl.rolling import RollingAggregator
+from .test_aggregate import make_grid_node, read_band
+
+
+@test_decorator
+def is_rolling_window_correct():
+    directory = tempfile.mkdtemp(prefix='test_rolling_', dir=os.environ.get('ETL_DIR', './'))
+    rng = np.random.default_rng(1)
+    grids = [rng.uniform(0, 40, size=(8, 10)).astype(np.float32) for _ in range(5)]
+    grids[3][0, 0] = np.nan
+    hour = 3600
+
+    nodes = [make_grid_node(grid) for grid in grids] + [make_grid_node(grids[3])]
+
+    rolling = RollingAggregator(directory, window=2 * hour)
+    for i, node in enumerate(nodes[:4]):
+        rolling.add(node, key=f'slice{i}', timestamp=i * hour)
+
+    # State survives between scheduled runs
+    rolling = RollingAggregator(directory, window=2 * hour)
+    is_duplicate_skipped = not rolling.add(nodes[5], key='slice3', timestamp=3 * hour)
+    rolling.add(nodes[4], key='slice4', timestamp=4 * hour)
+
+    window = np.array(grids[3:])
+    expected = {
+        'sum': np.nansum(window, axis=0),
+        'max': np.nanmax(window, axis=0),
+        'count': np.sum(~np.isnan(window), axis=0)}
+
+    is_correct = sorted(rolling.slices) == ['slice3', 'slice4']
+    # Slices keep the band's float32, compressed
+    with np.load(rolling.slice_path(rolling.slices['slice4'][0])) as archive:
+        is_compact = archive['values'].dtype == np.float32
+    for stat, values in expected.items():
+        result_node = rolling.result(stat)
+        is_correct = is_correct and np.array_equal(read_band(result_node), values.astype(np.uint8))
+        result_node.truncate()
+
+    for node in nodes:
+        node.truncate()
+    shutil.rmtree(directory)
+    return is_duplicate_skipped and is_correct and is_compact
+
+
+def main():
+    return [is_rolling_window_correct]
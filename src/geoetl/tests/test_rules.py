@@ -0,0 +1,84 @@
+import time
+import datetime
+import numpy as np
+from geoetl.utils import test_decorator
+from geoetl.geoapi import ListingStore
+from geoetl.rules import RuleValidator, SizeCap, DateWindow, ContentType, NamePattern
+
+START = 1627819200.0
+
+
+def synthetic_store(count: int) -> ListingStore:
+    rng = np.random.default_rng(4)
+    names = [f'MRMS_{"MESH" if i % 3 else "QPE"}_{i:06d}.grib2.gz' for i in range(count)]
+    epochs = START + rng.uniform(-86400, 2 * 86400, count)
+    epochs[::97] = np.nan
+    sizes = rng.integers(0, 4 * 10**6, count)
+    sizes[::89] = -1
+    return ListingStore(names, epochs, sizes, np.zeros(count, dtype=np.int32), ['https://example.com/mrms/'])
+
+
+@test_decorator
+def is_rule_mask_vectorized():
+    store = synthetic_store(50000)
+    rules = [SizeCap(2 * 10**6), DateWindow.day(datetime.date(2021, 8, 1)), NamePattern(r'_MESH_'), ContentType('application/x-gzip')]
+    validator = RuleValidator(rules)
+
+    began = time.time()
+    mask = validator.mask(store)
+    elapsed = time.time() - began
+    masked_rejected = dict(validator.rejected)
+
+    # Same answer, one listing at a time
+    validator.reset()
+    expected = [validator.is_valid(listing) for listing in store]
+    return np.array_equal(mask, expected) and masked_rejected == validator.rejected and masked_rejected['ContentType'] == 0 and \
+        masked_rejected['SizeCap'] > 0 and masked_rejected['DateWindow'] > 0 and elapsed < 1.0
+
+
+class CountedPattern(NamePattern):
+    '''
+    NamePattern without a mask, counting its per-listing checks
+    '''
+    def __init__(self, pattern: str):
+        super(CountedPattern, self).__init__(pattern)
+        self.checked = 0
+
+    def mask(self, store: ListingStore) -> np.ndarray:
+        return None
+
+    def is_valid(self, listing) -> bool:
+        self.checked += 1
+        return super(CountedPattern, self).is_valid(listing)
+
+
+@test_decorator
+def is_rule_select_trusting_mask():
+    store = synthetic_store(5000)
+    pattern = CountedPattern(r'_MESH_')
+    validator = RuleValidator([SizeCap(2 * 10**6), DateWindow.day(datetime.date(2021, 8, 1)), pattern])
+    selected = [listing.name for listing in validator.select(store)]
+    survivors = int(np.count_nonzero(validator.mask(store)))
+
+    validator.reset()
+    expected = [listing.name for listing in store if validator.is_valid(listing)]
+    # Masked rules aren't run again per row, the unmasked one only runs on rows the mask kept
+    return selected == expected and pattern.checked == survivors + len(store) and validator.rejected['CountedPattern'] > 0
+
+
+@test_decorator
+def is_header_rules_counted():
+    validator = RuleValidator([ContentType('application/x-gzip'), SizeCap(10**6, allow_unknown=True), DateWindow(START, START + 86400), NamePattern('QPE')])
+    headers = [
+        {'Content-Type': 'application/x-gzip', 'Content-Length': '2048', 'Last-Modified': 'Sun, 01 Aug 2021 12:00:00 GMT'},
+        {'Content-Type': 'application/x-gzip; charset=binary', 'Last-Modified': 'Mon, 02 Aug 2021 11:59:59 GMT'},
+        {'Content-Type': 'text/html', 'Content-Length': '2048', 'Last-Modified': 'Sun, 01 Aug 2021 12:00:00 GMT'},
+        {'Content-Type': 'application/x-gzip', 'Content-Length': str(2 * 10**6), 'Last-Modified': 'Mon, 02 Aug 2021 12:00:00 GMT'},
+        {'Content-Type': 'application/x-gzip', 'Content-Length': '2048', 'Last-Modified': 'not a date'},
+    ]
+    results = [validator.is_header_valid(h) for h in headers]
+    return results == [True, True, False, False, False] and validator.rejected == {'ContentType': 1, 'SizeCap': 1, 'DateWindow': 2, 'NamePattern': 0}
+
+
+def main():
+    return [is_rule_mask_vectorized, is_rule_select_trusting_mask, is_header_rules_counted]
@@ -0,0 +1,105 @@
+import os
+import gzip
+import tempfile
+from geoetl.utils import test_decorator, get_temp_file
+from geoetl.api import FileNode, Transform, Transformer, Index, GzipTransform, UnzipTransform
+from geoetl.scratch import Workspace
+from .test_index import AcceptAll, LocalListing
+
+
+class FailingTransform(Transform):
+    def transform(self) -> FileNode:
+        raise Exception('Failed on purpose')
+
+
+class PadTransform(Transform):
+    '''
+    Output of 1000 bytes per node, on disk
+    '''
+    def transform(self) -> FileNode:
+        destination_filepath = self.get_temp_file()
+        with open(destination_filepath, 'wb') as f:
+            f.write(b'x' * 1000)
+        return FileNode(filepath=destination_filepath)
+
+
+def etl_dir_entries() -> set:
+    return set(os.listdir(os.environ.get('ETL_DIR', './')))
+
+
+@test_decorator
+def is_temp_file_not_leaked():
+    before = etl_dir_entries()
+    filepaths = [get_temp_file(prefix='scratch') for _ in range(10)]
+    return etl_dir_entries() == before and len(set(filepaths)) == 10 and not any(os.path.exists(f) for f in filepaths)
+
+
+def write_file(content: bytes) -> str:
+    filepath = get_temp_file(prefix='source')
+    with open(filepath, 'wb') as f:
+        f.write(content)
+    return filepath
+
+
+@test_decorator
+def is_failed_chain_cleaned():
+    before = etl_dir_entries()
+    try:
+        Transformer([UnzipTransform, FailingTransform]).transformed_node(source=lambda: FileNode(filepath=write_file(gzip.compress(b'a' * 50))))
+        is_raised = False
+    except Exception:
+        is_raised = True
+    return is_raised and etl_dir_entries() == before
+
+
+@test_decorator
+def is_workspace_tiered_and_cleaned():
+    before = etl_dir_entries()
+    with tempfile.TemporaryDirectory() as tmpfs_directory:
+        with Workspace(tmpfs_directory=tmpfs_directory, tmpfs_max_bytes=100) as workspace:
+            is_tiered = get_temp_file('small', size_hint=10).startswith(workspace.tmpfs_root) and \
+                get_temp_file('large', size_hint=1000).startswith(workspace.root) and get_temp_file('unknown').startswith(workspace.root)
+            node = Transformer([GzipTransform, UnzipTransform]).transformed_node(root=FileNode(filepath=write_file(b'a' * 50)))
+            is_in_tmpfs = node.filepath.startswith(workspace.tmpfs_root)
+            kept = workspace.persist(node)
+            # Left behind on purpose, removed with the workspace
+            write_file(b'b' * 50)
+
+        try:
+            with Workspace(tmpfs_directory=tmpfs_directory) as failed:
+                write_file(b'c' * 50)
+                raise Exception('Run failed')
+        except Exception:
+            pass
+        is_tmpfs_empty = os.listdir(tmpfs_directory) == []
+
+    with open(kept.filepath, 'rb') as f:
+        is_kept = f.read() == b'a' * 50
+    kept.truncate()
+    return is_tiered and is_in_tmpfs and failed.root is None and is_tmpfs_empty and is_kept and etl_dir_entries() == before
+
+
+@test_decorator
+def is_index_throttled():
+    usages = []
+    with Workspace(quota=2500, wait_timeout=5, poll=0.01) as workspace:
+        index = Index('local://', AcceptAll(), Transformer([PadTransform]), mode='thread', max_workers=2)
+        index.listings = [LocalListing(f'pad{i}', b'p') for i in range(12)]
+        for node in index.iter_transform_index():
+            usages.append(workspace.usage())
+            node.truncate()
+
+        # Outputs kept by the consumer fill the quota, the next listing waits and then gives up
+        workspace.wait_timeout = 0.2
+        index.listings = index.listings[:10]
+        try:
+            index.transform_index()
+            is_raised = False
+        except Exception:
+            is_raised = True
+    # At most the quota plus the window of in-flight listings
+    return len(usages) == 12 and max(usages) <= 2500 + 4 * 1000 and is_raised
+
+
+def main():
+    return [is_temp_file_not_leaked, is_failed_chain_cleaned, is_workspace_tiered_and_cleaned, is_index_throttled]
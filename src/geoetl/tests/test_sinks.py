@@ -0,0 +1,67 @@
+import os
+import shutil
+import logging
+import numpy as np
+from io import BytesIO
+from moto.server import ThreadedMotoServer
+from geoetl.utils import test_decorator, get_temp_file
+from geoetl.sinks import S3Sink, ZarrSink
+from .test_aggregate import make_grid_node
+
+
+def moto_sink(**kwargs):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    sink = S3Sink(
+        'geoetl-test', key='testing', secret='testing', skip_instance_cache=True,
+        client_kwargs={'endpoint_url': f'http://{host}:{port}', 'region_name': 'us-east-1'}, **kwargs)
+    sink.s3.call_s3('create_bucket', Bucket=sink.bucket)
+    return server, sink
+
+
+@test_decorator
+def is_s3_multipart_round_trip():
+    server, sink = moto_sink(part_size=5 * 2**20, max_workers=3)
+    try:
+        payload = os.urandom(12 * 2**20 + 123)
+        source_filepath = get_temp_file(prefix='upload')
+        with open(source_filepath, 'wb') as f:
+            f.write(payload)
+
+        sink.put(source_filepath, 'grids/file.bin')
+        sink.put_obj(BytesIO(payload), 'grids/obj.bin')
+        sink.put_obj(BytesIO(b'small'), 'grids/small.bin')
+
+        destination_filepath = get_temp_file(prefix='download')
+        sink.get('grids/file.bin', destination_filepath)
+        with open(destination_filepath, 'rb') as f:
+            is_file_equal = f.read() == payload
+        is_obj_equal = sink.get_obj('grids/obj.bin').getvalue() == payload
+        is_small_equal = sink.get_obj('grids/small.bin').getvalue() == b'small'
+
+        os.remove(source_filepath)
+        os.remove(destination_filepath)
+    finally:
+        server.stop()
+    return is_file_equal and is_obj_equal and is_small_equal
+
+
+@test_decorator
+def is_zarr_window_read():
+    store = get_temp_file(prefix='store') + '.zarr'
+    sink = ZarrSink(store, chunks=(8, 8))
+    grids = [np.arange(20 * 30, dtype=np.float64).reshape(20, 30) * (i + 1) for i in range(3)]
+    for i, grid in enumerate(grids):
+        node = make_grid_node(grid)
+        sink.append(node, timestamp=1627819200 + 120 * i)
+        node.truncate()
+
+    window = sink.read_window(rows=slice(4, 12), cols=slice(10, 13))
+    shutil.rmtree(store)
+    return window.shape == (3, 8, 3) and np.array_equal(window.values, np.stack(grids)[:, 4:12, 10:13])
+
+
+def main():
+    return [is_s3_multipart_round_trip, is_zarr_window_read]
@@ -0,0 +1,73 @@
+import os
+import time
+import numpy as np
+from geoetl.utils import test_decorator, get_temp_file
+from geoetl.api import FileNode, Transformer, Listing, Index
+from geoetl.geoapi import SumAccumulator
+from geoetl.workqueue import WorkQueue, distribute
+from .test_index import AcceptAll, LocalListing
+from .test_aggregate import make_grid_node, read_band
+
+
+class GridListing(Listing):
+    def __init__(self, name: str, values: np.ndarray):
+        self.name = name
+        self.url = 'local://' + name
+        self.values = values
+
+    def download(self, downloader=None) -> FileNode:
+        if self.values is None:
+            raise Exception('Failed request for ' + self.url)
+        return make_grid_node(self.values)
+
+
+class GridIndex(Index):
+    def fetch_listings(self):
+        rng = np.random.default_rng(3)
+        self.grids = [rng.integers(0, 20, size=(8, 10)).astype(np.float64) for _ in range(9)]
+        self.listings = [GridListing(f'grid{i}', grid) for i, grid in enumerate(self.grids)]
+        # Fails on every attempt, should end up failed without blocking the others
+        self.listings.append(GridListing('broken', None))
+
+
+@test_decorator
+def is_work_queue_merged():
+    queue = WorkQueue(get_temp_file(prefix='queue') + '.sqlite', max_attempts=2)
+    index = GridIndex('local://', AcceptAll(), Transformer([]))
+    index.fetch_listings()
+    result_node = distribute(index, queue, SumAccumulator, processes=3)
+
+    result = read_band(result_node)
+    result_node.truncate()
+    counts = queue.counts()
+    partials, results = queue.unmerged()
+    os.remove(queue.filepath)
+
+    is_summed = np.array_equal(result, np.sum(index.grids, axis=0).astype(np.uint8))
+    return is_summed and counts == {'done': 9, 'failed': 1} and not partials and not results
+
+
+@test_decorator
+def is_lease_expired_retried():
+    queue = WorkQueue(get_temp_file(prefix='queue') + '.sqlite', visibility_timeout=0.05, max_attempts=2)
+    queue.enqueue([LocalListing('slow', b'x')])
+    is_deduplicated = queue.enqueue([LocalListing('slow', b'x')]) == 0
+
+    first = queue.lease('a')
+    is_hidden = queue.lease('b') is None
+    time.sleep(0.1)
+    second = queue.lease('b')
+    is_lost = not queue.complete(first, 'a', 'late') and queue.complete(second, 'b', 'on time')
+
+    queue.enqueue([LocalListing('stuck', b'x')])
+    queue.lease('a')
+    time.sleep(0.1)
+    queue.lease('b')
+    time.sleep(0.1)
+    is_given_up = queue.lease('c') is None and queue.counts() == {'done': 1, 'failed': 1}
+    os.remove(queue.filepath)
+    return is_deduplicated and first.listing.name == 'slow' and is_hidden and second.attempts == 2 and is_lost and is_given_up
+
+
+def main():
+    return [is_work_queue_merged, is_lease_expired_retried]
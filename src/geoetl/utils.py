@@ -1,18 +1,43 @@
-import tempfile
+import os
 import time
+import uuid
+from collections import deque
 from functools import wraps
+from .scratch import current_workspace
 
 
 def xor(a, b):
     return bool(a) ^ bool(b)
 
 
-def get_temp_file(prefix=''):
-    etl_dir = os.environ.get('ETL_DIR', './')
-    with tempfile.NamedTemporaryFile(delete=False, dir=etl_dir) as f:
-        folder = '/'.join(f.name.split('/')[:-1])
-        filename = f.name.split('/')[-1]
-        return f'{folder}/{prefix}_{filename}'
+def get_temp_file(prefix='', size_hint: int=None):
+    '''
+    Unique path, the file itself is not created. Inside the active scratch.Workspace if there is one
+    (size_hint, the expected bytes, picks its tier), else in ETL_DIR
+    '''
+    workspace = current_workspace()
+    if workspace is not None:
+        return workspace.path(prefix, size_hint)
+    return os.path.abspath(os.path.join(os.environ.get('ETL_DIR', './'), f'{prefix}_{uuid.uuid4().hex}'))
+
+
+def bounded_map(executor, func, iterable, window: int, workspace=None):
+    '''
+    Ordered executor.map that keeps at most "window" tasks in flight.
+    While workspace (a scratch.Workspace) is over its quota, finished results are yielded first,
+    so the caller can free space, then it waits for space before submitting more
+    '''
+    pending = deque()
+    for item in iterable:
+        if workspace is not None:
+            while pending and not workspace.has_space():
+                yield pending.popleft().result()
+            workspace.wait_for_space()
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
 
 
 def timeit(f, *args, **kwargs):
@@ -0,0 +1,235 @@
+import os
+import time
+import pickle
+import socket
+import sqlite3
+import multiprocessing
+from typing import List, Dict, NamedTuple
+from collections.abc import Callable
+from contextlib import contextmanager
+from .api import FileNode, Listing, Index
+from .geoapi import Accumulator
+from .utils import get_temp_file
+
+
+class Task(NamedTuple):
+    id: int
+    key: str
+    listing: Listing
+    attempts: int
+
+
+class WorkQueue:
+    '''
+    Durable task queue of listings in a SQLite file, e.g. under a shared ETL_DIR
+    (the filesystem must support SQLite locking). A lease hides a task from other workers
+    for visibility_timeout seconds; an expired lease puts it back, and a task that fails or
+    times out max_attempts times is marked failed. Workers record the result FileNode path of
+    each task, and optionally one partial aggregate covering the tasks they folded
+    '''
+    def __init__(self, filepath: str, visibility_timeout: float=300.0, max_attempts: int=3):
+        self.filepath = filepath
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        with self.connect() as connection:
+            connection.executescript('''
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY, key TEXT UNIQUE, listing BLOB, state TEXT DEFAULT 'queued',
+                    attempts INTEGER DEFAULT 0, worker TEXT, lease_expires REAL, result TEXT, error TEXT, partial INTEGER, merged INTEGER DEFAULT 0);
+                CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, lease_expires);
+                CREATE TABLE IF NOT EXISTS partials (
+                    id INTEGER PRIMARY KEY, worker TEXT, filepath TEXT, template TEXT, merged INTEGER DEFAULT 0);''')
+
+    @contextmanager
+    def connect(self):
+        # Autocommit, transactions are opened explicitly with BEGIN IMMEDIATE and roll back if not committed
+        connection = sqlite3.connect(self.filepath, timeout=60, isolation_level=None)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            yield connection
+        finally:
+            connection.close()
+
+    def enqueue(self, listings) -> int:
+        '''
+        Adds listings not queued before (by Listing.key()), returns how many were added
+        '''
+        with self.connect() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            added = 0
+            for listing in listings:
+                cursor = connection.execute(
+                    'INSERT OR IGNORE INTO tasks (key, listing) VALUES (?, ?)', (listing.key(), pickle.dumps(listing)))
+                added += cursor.rowcount
+            connection.execute('COMMIT')
+        return added
+
+    def lease(self, worker: str) -> Task:
+        '''
+        Next queued (or expired) task, None if there is none right now
+        '''
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                "UPDATE tasks SET state = 'failed', error = 'lease expired' "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?", (now, self.max_attempts))
+            row = connection.execute(
+                "SELECT id, key, listing, attempts FROM tasks WHERE state = 'queued' OR (state = 'leased' AND lease_expires < ?) "
+                "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE tasks SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                    (worker, now + self.visibility_timeout, row[0]))
+            connection.execute('COMMIT')
+
+        if row is None:
+            return None
+        return Task(row[0], row[1], pickle.loads(row[2]), row[3] + 1)
+
+    def extend(self, task: Task, worker: str) -> bool:
+        '''
+        Renews the lease of a long running task, False if it was lost
+        '''
+        with self.connect() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                (time.time() + self.visibility_timeout, task.id, worker))
+        return cursor.rowcount == 1
+
+    def complete(self, task: Task, worker: str, result: str) -> bool:
+        '''
+        False if the lease was lost to another worker, whose result then counts instead
+        '''
+        with self.connect() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET state = 'done', result = ?, lease_expires = NULL WHERE id = ? AND worker = ? AND state = 'leased'",
+                (result, task.id, worker))
+        return cursor.rowcount == 1
+
+    def fail(self, task: Task, worker: str, error: str) -> None:
+        with self.connect() as connection:
+            connection.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, error = ?, lease_expires = NULL "
+                "WHERE id = ? AND worker = ? AND state = 'leased'", (self.max_attempts, error, task.id, worker))
+
+    def commit_partial(self, worker: str, filepath: str, template: str, task_ids: List[int]) -> None:
+        with self.connect() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            partial = connection.execute(
+                'INSERT INTO partials (worker, filepath, template) VALUES (?, ?, ?)', (worker, filepath, template)).lastrowid
+            connection.executemany('UPDATE tasks SET partial = ? WHERE id = ?', [(partial, task_id) for task_id in task_ids])
+            connection.execute('COMMIT')
+
+    def counts(self) -> Dict[str, int]:
+        with self.connect() as connection:
+            return dict(connection.execute('SELECT state, COUNT(*) FROM tasks GROUP BY state').fetchall())
+
+    def is_drained(self) -> bool:
+        counts = self.counts()
+        return not counts.get('queued') and not counts.get('leased')
+
+    def unmerged(self):
+        '''
+        Unmerged partials as (id, filepath, template), and results of done tasks not covered by a partial
+        (a worker that stopped before committing its partial) as (id, filepath)
+        '''
+        with self.connect() as connection:
+            partials = connection.execute('SELECT id, filepath, template FROM partials WHERE merged = 0 ORDER BY id').fetchall()
+            results = connection.execute(
+                "SELECT id, result FROM tasks WHERE state = 'done' AND partial IS NULL AND merged = 0 ORDER BY id").fetchall()
+        return partials, results
+
+    def mark_merged(self, partial_ids: List[int], task_ids: List[int]) -> None:
+        with self.connect() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany('UPDATE partials SET merged = 1 WHERE id = ?', [(i,) for i in partial_ids])
+            connection.executemany('UPDATE tasks SET merged = 1 WHERE id = ?', [(i,) for i in task_ids])
+            connection.execute('COMMIT')
+
+
+def worker_name() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_worker(index: Index, queue: WorkQueue, accumulator: Accumulator=None, worker: str=None, wait: bool=True, poll: float=1.0) -> int:
+    '''
+    Leases and transforms tasks with index.transform_node until the queue is drained, returns how many were done.
+    With an accumulator, results are folded into one partial aggregate per worker (committed once at the end)
+    and their nodes removed; otherwise they stay on disk and their paths are recorded in the queue.
+    wait=True keeps polling while other workers hold leases, in case one of them expires
+    '''
+    worker = worker or worker_name()
+    done, nodes, task_ids = 0, [], []
+    while True:
+        task = queue.lease(worker)
+        if task is None:
+            if wait and not queue.is_drained():
+                time.sleep(poll)
+                continue
+            break
+
+        node, error = index.safe_transform_node(task.listing)
+        if error is not None:
+            print(f'Failed {task.key}: {error!r}')
+            queue.fail(task, worker, repr(error))
+            continue
+        if not queue.complete(task, worker, node.filepath):
+            node.truncate()
+            continue
+
+        done += 1
+        if accumulator is not None:
+            accumulator.add(node)
+            nodes.append(node)
+            task_ids.append(task.id)
+
+    if accumulator is not None and task_ids:
+        partial_filepath = accumulator.save_partial(get_temp_file(prefix='partial') + '.npz')
+        queue.commit_partial(worker, partial_filepath, accumulator.template.filepath, task_ids)
+        # The template backs the partial, the other nodes are folded in
+        for node in nodes:
+            if node is not accumulator.template:
+                node.truncate()
+    return done
+
+
+def merge(queue: WorkQueue, accumulator: Accumulator, cleanup: bool=True) -> FileNode:
+    '''
+    Folds every committed partial and every result not covered by one into accumulator, returns its result
+    '''
+    partials, results = queue.unmerged()
+    for _, filepath, template in partials:
+        accumulator.add_partial(filepath, template)
+    for _, filepath in results:
+        accumulator.add(FileNode(filepath=filepath))
+    result_node = accumulator.result()
+
+    queue.mark_merged([partial[0] for partial in partials], [result[0] for result in results])
+    if cleanup:
+        filepaths = [filepath for _, filepath, _ in partials] + [template for _, _, template in partials] + [filepath for _, filepath in results]
+        for filepath in filepaths:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+    return result_node
+
+
+def _run_forked_worker(index: Index, queue: WorkQueue, make_accumulator: Callable) -> None:
+    run_worker(index, queue, make_accumulator() if make_accumulator is not None else None)
+
+
+def distribute(index: Index, queue: WorkQueue, make_accumulator: Callable, processes: int=None) -> FileNode:
+    '''
+    Coordinator on one machine: enqueue the validated listings, run forked workers, merge their partials.
+    Workers on other machines sharing the queue file can call run_worker at the same time.
+    Keys already in the queue are not enqueued again, so a rerun only transforms new listings
+    '''
+    queue.enqueue(index.select_listings())
+
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_run_forked_worker, args=(index, queue, make_accumulator)) for _ in range(processes or index.max_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return merge(queue, make_accumulator())